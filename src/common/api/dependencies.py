@@ -1,17 +1,34 @@
-from typing import Generator
+import inspect
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Generator
 
 from aiohttp import ClientSession
 from asyncpg import Connection
 
 from common.db.db import DatabaseProvider
+from common.http.session import ClientSessionProvider
 
 
-async def get_client_session() -> Generator[ClientSession, None, None]:
-    async with ClientSession() as session:
-        yield session
+async def get_client_session() -> ClientSession:
+    return await ClientSessionProvider.get_session()
 
 
 async def get_db_connection() -> Generator[Connection, None, None]:
     pool = await DatabaseProvider.get_pool()
     async with pool.acquire() as connection:
         yield connection
+
+
+@asynccontextmanager
+async def fresh_dependencies(func: Callable, kwargs: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    # request-scoped dependencies are released once the response is sent, work that outlives it needs its own
+    signature = inspect.signature(func)
+    fresh_kwargs = dict(kwargs)
+    async with AsyncExitStack() as stack:
+        for name, parameter in signature.parameters.items():
+            if parameter.annotation is Connection:
+                pool = await DatabaseProvider.get_pool()
+                fresh_kwargs[name] = await stack.enter_async_context(pool.acquire())
+            elif parameter.annotation is ClientSession:
+                fresh_kwargs[name] = await ClientSessionProvider.get_session()
+        yield fresh_kwargs
@@ -4,11 +4,13 @@ from fastapi import FastAPI
 
 from common.db.db import DatabaseProvider
 from common.db.model import create_tables
+from common.http.session import ClientSessionProvider
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await DatabaseProvider.setup()
+    await ClientSessionProvider.setup()
 
     pool = await DatabaseProvider.get_pool()
     async with pool.acquire() as connection:
@@ -16,4 +18,5 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    await ClientSessionProvider.teardown()
     await DatabaseProvider.teardown()
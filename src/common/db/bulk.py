@@ -0,0 +1,83 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from asyncpg import Connection
+
+
+def merge_duplicates(records: Iterable[Tuple], key_indexes: Sequence[int]) -> List[Tuple]:
+    # same result as upserting the rows one after another with COALESCE: later non-null values win
+    merged: Dict[Tuple, list] = {}
+    for record in records:
+        key = tuple(record[idx] for idx in key_indexes)
+        current = merged.get(key)
+        if current is None:
+            merged[key] = list(record)
+            continue
+        for idx, value in enumerate(record):
+            if value is not None:
+                current[idx] = value
+    return [tuple(record) for record in merged.values()]
+
+
+class BulkMerge:
+    # records of several tables are merged together: one statement creates every staging table, each table is
+    # COPYed, and one multi-statement execute runs the merges in the order they were added
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self._merges: List[Tuple[str, str, Sequence[str], List[Tuple], str]] = []
+
+    def add(
+        self,
+        table: str,
+        columns: Sequence[str],
+        records: Iterable[Tuple],
+        on_conflict: str,
+        merge_on: Optional[Sequence[str]] = None,
+    ):
+        # ON CONFLICT DO UPDATE can't touch the same row twice in one statement, so duplicate keys are merged first
+        records = merge_duplicates(records, [columns.index(column) for column in merge_on]) if merge_on else list(records)
+        if records:
+            self._merges.append((f'staging_{len(self._merges)}_{table}', table, columns, records, on_conflict))
+
+    async def execute(self):
+        merges, self._merges = self._merges, []
+        if not merges:
+            return
+        # the staging tables only live inside a transaction, the caller's one is reused rather than nesting a savepoint
+        if self.connection.is_in_transaction():
+            await self._execute(merges)
+        else:
+            async with self.connection.transaction():
+                await self._execute(merges)
+
+    async def _execute(self, merges: List[Tuple[str, str, Sequence[str], List[Tuple], str]]):
+        await self.connection.execute(''.join(
+            f"""
+            CREATE TEMP TABLE {staging_table} ON COMMIT DROP AS
+            SELECT {', '.join(columns)} FROM {table} WITH NO DATA;
+            """
+            for staging_table, table, columns, _, _ in merges
+        ))
+        for staging_table, _, columns, records, _ in merges:
+            await self.connection.copy_records_to_table(staging_table, records=records, columns=list(columns))
+        await self.connection.execute(''.join(
+            f"""
+            INSERT INTO {table} ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM {staging_table}
+            {on_conflict};
+            DROP TABLE {staging_table};
+            """
+            for staging_table, table, columns, _, on_conflict in merges
+        ))
+
+
+async def copy_merge(
+    connection: Connection,
+    table: str,
+    columns: Sequence[str],
+    records: Iterable[Tuple],
+    on_conflict: str,
+    merge_on: Optional[Sequence[str]] = None,
+):
+    bulk = BulkMerge(connection)
+    bulk.add(table, columns, records, on_conflict, merge_on)
+    await bulk.execute()
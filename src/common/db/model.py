@@ -2,7 +2,14 @@ from typing import List, Optional, Tuple
 
 from asyncpg import Connection
 
-from common.domain.schema import AdditionalPatentIds, PatentSimilarFamilySimple
+from common.db.bulk import copy_merge
+from common.domain.schema import AdditionalPatentIds, Patent, PatentSimilarFamilySimple
+
+PATENT_COLUMNS = ('id', 'title_ru', 'title_en', 'publication_date', 'application_number',
+                  'application_filing_date', 'snippet_ru', 'snippet_en', 'abstract_ru',
+                  'abstract_en', 'claims_ru', 'claims_en', 'description_ru', 'description_en')
+
+READ_MODEL_COLUMNS = PATENT_COLUMNS + ('ipc', 'cpc', 'patentees_ru', 'patentees_en', 'applicants_ru', 'applicants_en', 'inventors_ru', 'inventors_en')
 
 
 async def create_table_patent(connection: Connection):
@@ -303,6 +310,23 @@ async def create_table_patent_inventor_en(connection: Connection):
     )
 
 
+async def create_patent_read_model_columns(connection: Connection):
+    await connection.execute(
+        """
+        ALTER TABLE patent
+            ADD COLUMN IF NOT EXISTS ipc                        TEXT[],
+            ADD COLUMN IF NOT EXISTS cpc                        TEXT[],
+            ADD COLUMN IF NOT EXISTS patentees_ru               TEXT[],
+            ADD COLUMN IF NOT EXISTS patentees_en               TEXT[],
+            ADD COLUMN IF NOT EXISTS applicants_ru              TEXT[],
+            ADD COLUMN IF NOT EXISTS applicants_en              TEXT[],
+            ADD COLUMN IF NOT EXISTS inventors_ru               TEXT[],
+            ADD COLUMN IF NOT EXISTS inventors_en               TEXT[],
+            ADD COLUMN IF NOT EXISTS aggregates_refreshed_at    TIMESTAMP;
+        """
+    )
+
+
 async def create_table_tg_user(connection: Connection):
     await connection.execute(
         """
@@ -336,6 +360,77 @@ async def create_table_tg_user_search_query(connection: Connection):
     )
 
 
+async def create_table_patent_document_raw(connection: Connection):
+    await connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS patent_document_raw
+        (
+            id              VARCHAR PRIMARY KEY,
+            content         BYTEA NOT NULL,
+            size            INT NOT NULL,
+            fetched_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            accessed_at     TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS patent_document_raw_accessed_at_idx ON patent_document_raw (accessed_at);
+        """
+    )
+
+
+async def create_table_summary_job(connection: Connection):
+    await connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS summary_job
+        (
+            patent_id       VARCHAR NOT NULL,
+            section         VARCHAR NOT NULL,
+            status          VARCHAR NOT NULL DEFAULT 'pending',
+            attempts        INT NOT NULL DEFAULT 0,
+            error           TEXT,
+            locked_until    TIMESTAMP,
+            created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (patent_id, section)
+        );
+        CREATE INDEX IF NOT EXISTS summary_job_status_created_at_idx ON summary_job (status, created_at);
+        """
+    )
+
+
+async def get_patents_by_ids(connection: Connection, ids: List[str]) -> List[Patent]:
+    results = await connection.fetch(
+        f"""
+        SELECT {', '.join(READ_MODEL_COLUMNS)}
+        FROM patent
+        WHERE id = ANY($1);
+        """,
+        ids
+    )
+    return [Patent.model_validate(dict(result)) for result in results]
+
+
+async def refresh_patent_aggregates(connection: Connection, ids: List[str], only_stale: bool = False):
+    query = """
+        UPDATE patent p
+        SET ipc = (SELECT array_agg(pi.ipc_id ORDER BY pi.ipc_id) FROM patent_ipc pi WHERE pi.patent_id = p.id),
+            cpc = (SELECT array_agg(pc.cpc_id ORDER BY pc.cpc_id) FROM patent_cpc pc WHERE pc.patent_id = p.id),
+            patentees_ru = (SELECT array_agg(e.name ORDER BY e.name) FROM patent_patentee_ru l JOIN patentee_ru e ON l.patentee_id = e.id WHERE l.patent_id = p.id),
+            patentees_en = (SELECT array_agg(e.name ORDER BY e.name) FROM patent_patentee_en l JOIN patentee_en e ON l.patentee_id = e.id WHERE l.patent_id = p.id),
+            applicants_ru = (SELECT array_agg(e.name ORDER BY e.name) FROM patent_applicant_ru l JOIN applicant_ru e ON l.applicant_id = e.id WHERE l.patent_id = p.id),
+            applicants_en = (SELECT array_agg(e.name ORDER BY e.name) FROM patent_applicant_en l JOIN applicant_en e ON l.applicant_id = e.id WHERE l.patent_id = p.id),
+            inventors_ru = (SELECT array_agg(e.name ORDER BY e.name) FROM patent_inventor_ru l JOIN inventor_ru e ON l.inventor_id = e.id WHERE l.patent_id = p.id),
+            inventors_en = (SELECT array_agg(e.name ORDER BY e.name) FROM patent_inventor_en l JOIN inventor_en e ON l.inventor_id = e.id WHERE l.patent_id = p.id),
+            aggregates_refreshed_at = CURRENT_TIMESTAMP
+        WHERE p.id = ANY($1) AND (NOT $2 OR p.aggregates_refreshed_at IS NULL);
+    """
+    await connection.execute(query, ids, only_stale)
+
+
+async def load_patents(connection: Connection, ids: List[str]) -> List[Patent]:
+    # rows written before the read model columns existed are backfilled on first read
+    await refresh_patent_aggregates(connection, ids, only_stale=True)
+    return await get_patents_by_ids(connection, ids)
+
+
 async def get_patent_description(connection: Connection, patent_id: str) -> Optional[Tuple[str, str]]:
     result = await connection.fetchrow(
         """
@@ -495,6 +590,24 @@ async def get_patent_all_and_summary(connection: Connection, patent_id: str):
         return None
 
 
+async def get_patent_section_summaries(connection: Connection, patent_id: str) -> Optional[List[Tuple[Optional[str], Optional[str]]]]:
+    result = await connection.fetchrow(
+        """
+        SELECT description_ru, sber_description_summary_ru,
+               snippet_ru, sber_snippet_summary_ru,
+               abstract_ru, sber_abstract_summary_ru,
+               claims_ru, sber_claims_summary_ru
+        FROM patent
+        WHERE id = $1;
+        """,
+        patent_id
+    )
+    if not result:
+        return None
+    # same section order as the text get_patent_all_and_summary concatenates
+    return [(result[f'{section}_ru'], result[f'sber_{section}_summary_ru']) for section in ['description', 'snippet', 'abstract', 'claims']]
+
+
 async def save_patent_all_summary(connection: Connection, patent_id: str, sber_all_title_ru: str, sber_all_summary_ru: str):
     await connection.execute(
         """
@@ -569,36 +682,36 @@ async def get_latest_search_query(connection: Connection, user_id: int) -> Optio
 
 
 async def insert_patent_family_similarity(connection: Connection, data: List[PatentSimilarFamilySimple]):
-    await connection.executemany(
-        """
-        INSERT INTO patent_family_similarity (first_id, second_id, similarity, similarity_norm)
-        VALUES ($1, $2, $3, $4)
-        ON CONFLICT (first_id, second_id) DO UPDATE 
-        SET similarity = EXCLUDED.similarity, similarity_norm = EXCLUDED.similarity_norm;
+    await copy_merge(
+        connection,
+        'patent_family_similarity',
+        ('first_id', 'second_id', 'similarity', 'similarity_norm'),
+        [(x.first_id, x.second_id, x.similarity, x.similarity_norm) for x in data],
+        """
+        ON CONFLICT (first_id, second_id) DO UPDATE
+        SET similarity = EXCLUDED.similarity, similarity_norm = EXCLUDED.similarity_norm
         """,
-        [(x.first_id, x.second_id, x.similarity, x.similarity_norm) for x in data]
+        merge_on=('first_id', 'second_id'),
     )
 
 
 async def insert_patent_referred_from(connection: Connection, data: List[AdditionalPatentIds]):
-    await connection.executemany(
-        """
-        INSERT INTO patent_referred_from (source_id, referred_id)
-        VALUES ($1, $2)
-        ON CONFLICT (source_id, referred_id) DO NOTHING;
-        """,
-        [(x.source_id, x.referred_id) for x in data]
+    await copy_merge(
+        connection,
+        'patent_referred_from',
+        ('source_id', 'referred_id'),
+        [(x.source_id, x.referred_id) for x in data],
+        "ON CONFLICT (source_id, referred_id) DO NOTHING",
     )
 
 
 async def insert_patent_prototype_docs(connection: Connection, data: List[AdditionalPatentIds]):
-    await connection.executemany(
-        """
-        INSERT INTO patent_prototype_docs (source_id, referred_id)
-        VALUES ($1, $2)
-        ON CONFLICT (source_id, referred_id) DO NOTHING;
-        """,
-        [(x.source_id, x.referred_id) for x in data]
+    await copy_merge(
+        connection,
+        'patent_prototype_docs',
+        ('source_id', 'referred_id'),
+        [(x.source_id, x.referred_id) for x in data],
+        "ON CONFLICT (source_id, referred_id) DO NOTHING",
     )
 
 
@@ -624,5 +737,108 @@ async def create_tables(connection: Connection):
     await create_table_patent_applicant_en(connection)
     await create_table_patent_inventor_ru(connection)
     await create_table_patent_inventor_en(connection)
+    await create_patent_read_model_columns(connection)
     await create_table_tg_user(connection)
     await create_table_tg_user_search_query(connection)
+    await create_table_patent_document_raw(connection)
+    await create_table_summary_job(connection)
+
+
+async def enqueue_summary_job(connection: Connection, patent_id: str, section: str) -> str:
+    # callers only enqueue while the summary is missing, so pending and running jobs are shared and finished ones restart
+    status = await connection.fetchval(
+        """
+        INSERT INTO summary_job (patent_id, section)
+        VALUES ($1, $2)
+        ON CONFLICT (patent_id, section) DO UPDATE
+        SET status = 'pending', attempts = 0, error = NULL, locked_until = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE summary_job.status IN ('done', 'failed')
+        RETURNING status;
+        """,
+        patent_id, section
+    )
+    if status is not None:
+        return status
+    return await connection.fetchval(
+        """
+        SELECT status
+        FROM summary_job
+        WHERE patent_id = $1 AND section = $2;
+        """,
+        patent_id, section
+    )
+
+
+async def claim_summary_job(connection: Connection, lease_seconds: float) -> Optional[Tuple[str, str, int]]:
+    # running jobs whose lease ran out belong to a worker that died and are picked up again
+    result = await connection.fetchrow(
+        """
+        UPDATE summary_job
+        SET status = 'running', attempts = attempts + 1, locked_until = CURRENT_TIMESTAMP + make_interval(secs => $1), updated_at = CURRENT_TIMESTAMP
+        WHERE (patent_id, section) = (
+            SELECT patent_id, section
+            FROM summary_job
+            WHERE status = 'pending' OR (status = 'running' AND locked_until < CURRENT_TIMESTAMP)
+            ORDER BY created_at
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING patent_id, section, attempts;
+        """,
+        lease_seconds
+    )
+    return (result['patent_id'], result['section'], result['attempts']) if result else None
+
+
+async def enqueue_claimed_summary_job(connection: Connection, patent_id: str, section: str, lease_seconds: float) -> Optional[int]:
+    # enqueues the job already claimed by the caller, so no worker can take it in between; None if someone else runs it
+    result = await connection.fetchval(
+        """
+        INSERT INTO summary_job (patent_id, section, status, attempts, locked_until)
+        VALUES ($1, $2, 'running', 1, CURRENT_TIMESTAMP + make_interval(secs => $3))
+        ON CONFLICT (patent_id, section) DO UPDATE
+        SET status = 'running',
+            attempts = CASE WHEN summary_job.status IN ('done', 'failed') THEN 1 ELSE summary_job.attempts + 1 END,
+            error = NULL, locked_until = EXCLUDED.locked_until, updated_at = CURRENT_TIMESTAMP
+        WHERE summary_job.status IN ('pending', 'done', 'failed')
+           OR (summary_job.status = 'running' AND summary_job.locked_until < CURRENT_TIMESTAMP)
+        RETURNING attempts;
+        """,
+        patent_id, section, lease_seconds
+    )
+    return result
+
+
+async def renew_summary_job_lease(connection: Connection, patent_id: str, section: str, attempts: int, lease_seconds: float):
+    await connection.execute(
+        """
+        UPDATE summary_job
+        SET locked_until = CURRENT_TIMESTAMP + make_interval(secs => $4), updated_at = CURRENT_TIMESTAMP
+        WHERE patent_id = $1 AND section = $2 AND status = 'running' AND attempts = $3;
+        """,
+        patent_id, section, attempts, lease_seconds
+    )
+
+
+async def finish_summary_job(connection: Connection, patent_id: str, section: str, attempts: int, status: str, error: Optional[str] = None):
+    # a worker whose job was reclaimed in the meantime no longer owns it and leaves the status alone
+    await connection.execute(
+        """
+        UPDATE summary_job
+        SET status = $4, error = $5, locked_until = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE patent_id = $1 AND section = $2 AND status = 'running' AND attempts = $3;
+        """,
+        patent_id, section, attempts, status, error
+    )
+
+
+async def get_summary_job(connection: Connection, patent_id: str, section: str) -> Optional[Tuple[str, Optional[str]]]:
+    result = await connection.fetchrow(
+        """
+        SELECT status, error
+        FROM summary_job
+        WHERE patent_id = $1 AND section = $2;
+        """,
+        patent_id, section
+    )
+    return (result['status'], result['error']) if result else None
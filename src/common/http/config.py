@@ -0,0 +1,14 @@
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class HTTPClientConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix='HTTP_CLIENT_')
+
+    LIMIT: int = Field(100)
+    LIMIT_PER_HOST: int = Field(20)
+    KEEPALIVE_TIMEOUT: float = Field(30)
+    DNS_CACHE_TTL: int = Field(300)
+
+
+http_client_config = HTTPClientConfig()
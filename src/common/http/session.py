@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+from aiohttp import ClientSession, TCPConnector, TraceConfig, TraceConnectionCreateEndParams, TraceConnectionReuseconnParams
+
+from common.http.config import http_client_config
+
+
+class UninitializedClientSessionError(Exception):
+    def __init__(
+        self,
+        message="The HTTP client session has not been properly initialized. Please ensure setup is called",
+    ):
+        self.message = message
+        super().__init__(self.message)
+
+
+class ClientSessionProvider:
+    _session: Optional[ClientSession] = None
+    _metrics: Dict[str, int] = {
+        'requests': 0,
+        'connections_created': 0,
+        'connections_reused': 0,
+    }
+
+    @classmethod
+    async def _on_request_start(cls, session: ClientSession, context: SimpleNamespace, params):
+        cls._metrics['requests'] += 1
+
+    @classmethod
+    async def _on_connection_create_end(cls, session: ClientSession, context: SimpleNamespace, params: TraceConnectionCreateEndParams):
+        cls._metrics['connections_created'] += 1
+
+    @classmethod
+    async def _on_connection_reuseconn(cls, session: ClientSession, context: SimpleNamespace, params: TraceConnectionReuseconnParams):
+        cls._metrics['connections_reused'] += 1
+
+    @classmethod
+    async def setup(cls):
+        trace_config = TraceConfig()
+        trace_config.on_request_start.append(cls._on_request_start)
+        trace_config.on_connection_create_end.append(cls._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(cls._on_connection_reuseconn)
+
+        connector = TCPConnector(
+            limit=http_client_config.LIMIT,
+            limit_per_host=http_client_config.LIMIT_PER_HOST,
+            keepalive_timeout=http_client_config.KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=http_client_config.DNS_CACHE_TTL,
+            use_dns_cache=True,
+        )
+        cls._session = ClientSession(connector=connector, trace_configs=[trace_config])
+
+    @classmethod
+    async def get_session(cls) -> ClientSession:
+        if not cls._session:
+            raise UninitializedClientSessionError()
+        return cls._session
+
+    @classmethod
+    def get_metrics(cls) -> Dict[str, float]:
+        connections_total = cls._metrics['connections_created'] + cls._metrics['connections_reused']
+        return {
+            **cls._metrics,
+            'connection_reuse_ratio': cls._metrics['connections_reused'] / connections_total if connections_total else 0.0,
+        }
+
+    @classmethod
+    async def teardown(cls):
+        if not cls._session:
+            raise UninitializedClientSessionError()
+        await cls._session.close()
+        cls._session = None
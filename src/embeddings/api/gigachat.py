@@ -2,8 +2,10 @@ from typing import List
 
 from fastapi import APIRouter, Query
 
-from embeddings.api.schema import EmbeddingRequest, SearchRequest
-from embeddings.domain.embeddings import domain_save_embeddings, gigachat_embedding_function, gigachat_rospatent_titles_collection
+from embeddings.api.schema import EmbeddingRequest, RerankRequest, RerankResponse, SearchRequest
+from embeddings.domain.embeddings import async_gigachat_rospatent_titles_collection, domain_save_embeddings, gigachat_embedding_client
+from embeddings.domain.query_cache import embed_query_cached, get_query_embedding_cache_metrics
+from embeddings.domain.rerank import rerank_candidates
 
 gigachat_router = APIRouter(
     prefix="/gigachat",
@@ -17,8 +19,8 @@ gigachat_router = APIRouter(
 async def save_embedding(
     request: List[EmbeddingRequest],
 ):
-    await domain_save_embeddings(request)
-    return {"message": "Embeddings saved"}
+    counts = await domain_save_embeddings(request)
+    return {"message": "Embeddings saved", **counts}
 
 
 @gigachat_router.post(
@@ -30,14 +32,32 @@ async def search(
     include_embeddings: bool = Query(False),
     ids: List[str] = Query([], alias="id"),
 ):
-    collection_clean = gigachat_rospatent_titles_collection
+    collection_clean = async_gigachat_rospatent_titles_collection
 
     where = {'id': {'$in': ids}} if ids else None
     include = ["metadatas", "documents", "distances"] + (["embeddings"] if include_embeddings else [])
 
-    return collection_clean.query(
-        query_embeddings=gigachat_embedding_function([request.text]),
+    return await collection_clean.query(
+        query_embeddings=[await embed_query_cached(gigachat_embedding_client, request.text)],
         n_results=n_results,
         include=include,
         where=where
     )
+
+
+@gigachat_router.post(
+    "/rerank",
+)
+async def rerank(
+    request: RerankRequest,
+) -> RerankResponse:
+    return await rerank_candidates(request)
+
+
+@gigachat_router.get(
+    "/metrics",
+)
+async def metrics():
+    return {
+        'query_embedding_cache': get_query_embedding_cache_metrics(),
+    }
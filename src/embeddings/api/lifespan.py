@@ -0,0 +1,24 @@
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from embeddings.domain.clients import shutdown_clients
+from embeddings.domain.embeddings import persist_vector_store, wait_for_pending_stores
+from embeddings.domain.preprocessing import shutdown_executor
+from redis.config import redis_config
+from redis.redis import RedisProvider
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if redis_config.ENABLED:
+        await RedisProvider.setup()
+
+    yield
+
+    await wait_for_pending_stores()
+    if redis_config.ENABLED:
+        await RedisProvider.teardown()
+    shutdown_clients()
+    persist_vector_store()
+    shutdown_executor()
@@ -3,6 +3,7 @@ from starlette.middleware.cors import CORSMiddleware
 from starlette.responses import RedirectResponse
 
 from embeddings.api.gigachat import gigachat_router
+from embeddings.api.lifespan import lifespan
 
 
 def configure_cors(app: FastAPI):
@@ -18,6 +19,7 @@ def configure_cors(app: FastAPI):
 app = FastAPI(
     debug=True,
     title='embeddings',
+    lifespan=lifespan,
 )
 
 configure_cors(app)
@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 
@@ -13,3 +15,13 @@ class EmbeddingTestRequest(BaseModel):
 
 class SearchRequest(BaseModel):
     text: str
+
+
+class RerankRequest(BaseModel):
+    text: str
+    candidates: List[EmbeddingRequest]
+
+
+class RerankResponse(BaseModel):
+    ids: List[str]
+    scores: List[Optional[float]]
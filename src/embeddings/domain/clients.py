@@ -0,0 +1,66 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, List, Optional, Union
+
+from chromadb.api.models.Collection import Collection
+from langchain_community.embeddings.gigachat import GigaChatEmbeddings
+
+from embeddings.domain.local_index import LocalVectorIndex
+from embeddings.infrastructure.embeddings_config import embeddings_config
+
+
+class BoundedExecutor:
+    # the sync clients keep their connections alive between calls, so every call reuses a pooled worker and connection
+    def __init__(self, name: str, max_workers: int, timeout: float):
+        self.name = name
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(self._executor, partial(func, *args, **kwargs)), self.timeout)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# separate pools so a long ingest batch can not take every worker a concurrent search needs
+embedding_executor = BoundedExecutor('embedding', embeddings_config.EMBEDDING_MAX_WORKERS, embeddings_config.EMBEDDING_TIMEOUT)
+vector_store_executor = BoundedExecutor('vector-store', embeddings_config.VECTOR_STORE_MAX_WORKERS, embeddings_config.VECTOR_STORE_TIMEOUT)
+
+
+class AsyncEmbeddingClient:
+    def __init__(self, embeddings: GigaChatEmbeddings):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, 'model', None) or 'Embeddings'
+
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await embedding_executor.run(self.embeddings.embed_documents, texts=texts)
+
+
+class AsyncCollection:
+    def __init__(self, collection: Union[Collection, LocalVectorIndex]):
+        self.collection = collection
+
+    async def get(self, **kwargs):
+        return await vector_store_executor.run(self.collection.get, **kwargs)
+
+    async def delete(self, **kwargs):
+        return await vector_store_executor.run(self.collection.delete, **kwargs)
+
+    async def upsert(self, **kwargs):
+        return await vector_store_executor.run(self.collection.upsert, **kwargs)
+
+    async def query(self, **kwargs):
+        return await vector_store_executor.run(self.collection.query, **kwargs)
+
+
+def shutdown_clients():
+    embedding_executor.shutdown()
+    vector_store_executor.shutdown()
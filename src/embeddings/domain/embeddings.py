@@ -1,15 +1,21 @@
-from typing import List
+import asyncio
+import hashlib
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
 
 import chromadb
 from chromadb import Documents, EmbeddingFunction, Embeddings
-from cleantext import clean
 from langchain_community.embeddings.gigachat import GigaChatEmbeddings
-from langchain_text_splitters import TokenTextSplitter
 from tqdm import tqdm
 
 from embeddings.api.schema import EmbeddingRequest
+from embeddings.domain.clients import AsyncCollection, AsyncEmbeddingClient
+from embeddings.domain.local_index import LocalVectorIndex
+from embeddings.domain.preprocessing import preprocess_texts
 from embeddings.infrastructure.chroma_db_config import chroma_db_config
 from embeddings.infrastructure.config import giga_chat_api_config
+from embeddings.infrastructure.embeddings_config import embeddings_config
 
 
 class GigaChatEmbeddingFunction(EmbeddingFunction[Documents]):
@@ -20,62 +26,173 @@ class GigaChatEmbeddingFunction(EmbeddingFunction[Documents]):
         return self.embeddings.embed_documents(texts=input)
 
 
-text_splitter = TokenTextSplitter.from_tiktoken_encoder(
-    encoding_name='cl100k_base',
-    model_name="text-embedding-3-large",
-    chunk_size=4096,
-    chunk_overlap=0
-)
-chroma_client = chromadb.HttpClient(host=chroma_db_config.HOST, port=chroma_db_config.PORT)
 gigachat_embedding_function = GigaChatEmbeddingFunction(credentials=giga_chat_api_config.TOKEN, scope=giga_chat_api_config.SCOPE)
-# chroma_client.delete_collection(name='gigachat_rospatent_titles_collection')
-gigachat_rospatent_titles_collection = chroma_client.get_or_create_collection(name='gigachat_rospatent_titles_collection', embedding_function=gigachat_embedding_function)
+if embeddings_config.VECTOR_STORE == 'local':
+    gigachat_rospatent_titles_collection = LocalVectorIndex(os.path.join(embeddings_config.LOCAL_INDEX_PATH, 'gigachat_rospatent_titles_collection'))
+else:
+    chroma_client = chromadb.HttpClient(host=chroma_db_config.HOST, port=chroma_db_config.PORT)
+    # chroma_client.delete_collection(name='gigachat_rospatent_titles_collection')
+    gigachat_rospatent_titles_collection = chroma_client.get_or_create_collection(name='gigachat_rospatent_titles_collection', embedding_function=gigachat_embedding_function)
+gigachat_embedding_client = AsyncEmbeddingClient(gigachat_embedding_function.embeddings)
+async_gigachat_rospatent_titles_collection = AsyncCollection(gigachat_rospatent_titles_collection)
 
 
-async def domain_save_embeddings(
-    request: List[EmbeddingRequest],
-):
-    collection_clean = gigachat_rospatent_titles_collection
-    for item in tqdm(request):
-        print(f"Processing item {item.id}")
-        full_text_clean = clean(
-            item.text,
-            fix_unicode=True,
-            to_ascii=False,
-            lower=True,
-            normalize_whitespace=True,
-            no_line_breaks=True,
-            strip_lines=True,
-            keep_two_line_breaks=False,
-            no_urls=True,
-            no_emails=True,
-            no_phone_numbers=True,
-            no_numbers=True,
-            no_digits=True,
-            no_currency_symbols=True,
-            no_punct=True,
-            no_emoji=True,
-            replace_with_url="<ссылка>",
-            replace_with_email="<почта>",
-            replace_with_phone_number="<телефон>",
-            replace_with_number="",
-            replace_with_digit="",
-            replace_with_currency_symbol="<валюта>",
-            replace_with_punct="",
-            lang="en",
-        )
-        full_text_clean = "".join([c for c in full_text_clean if c.isalpha() or c.isspace()])
-
-        clean_splits = text_splitter.split_text(full_text_clean)
+# writes of freshly computed vectors the request that computed them did not wait for
+_pending_stores: Set[asyncio.Task] = set()
+
+
+def persist_vector_store():
+    if isinstance(gigachat_rospatent_titles_collection, LocalVectorIndex):
+        gigachat_rospatent_titles_collection.persist()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+async def get_embedded_chunks(collection: AsyncCollection, ids: List[str], include_embeddings: bool = False) -> Dict[str, Tuple[str, List[List[float]]]]:
+    # chunks of one item share its metadata id, entries saved before hashing was introduced map to an empty hash
+    if not ids:
+        return {}
+    existing = await collection.get(where={'id': {'$in': ids}}, include=['metadatas'] + (['embeddings'] if include_embeddings else []))
+    embeddings = existing['embeddings'] if include_embeddings else [None] * len(existing['metadatas'])
 
+    chunks: Dict[str, Tuple[str, List[List[float]]]] = {}
+    for metadata, embedding in zip(existing['metadatas'], embeddings):
+        _, vectors = chunks.setdefault(metadata['id'], (metadata.get('content_hash', ''), []))
+        if embedding is not None:
+            vectors.append(embedding)
+    return chunks
+
+
+def make_chunk_id(id_: str, idx: int) -> str:
+    if '.txt' in id_:
+        return id_.replace('.txt', '_' + str(idx) + '.txt')
+    # the first chunk keeps the bare id it was always stored under
+    return id_ if idx == 0 else f'{id_}_{idx}'
+
+
+def group_chunks(
+    items: List[EmbeddingRequest],
+    item_chunks: List[List[Tuple[str, int]]],
+    hashes: Dict[str, str],
+) -> List[Tuple[List[str], List[str], List[dict]]]:
+    batches = []
+    ids, documents, metadatas, batch_tokens = [], [], [], 0
+    for item, chunks in zip(items, item_chunks):
+        for idx, (chunk, tokens) in enumerate(chunks):
+            if documents and (len(documents) >= embeddings_config.BATCH_MAX_CHUNKS or batch_tokens + tokens > embeddings_config.BATCH_MAX_TOKENS):
+                batches.append((ids, documents, metadatas))
+                ids, documents, metadatas, batch_tokens = [], [], [], 0
+            ids.append(make_chunk_id(item.id, idx))
+            documents.append(chunk)
+            metadatas.append({"part_index": idx, 'id': item.id, 'content_hash': hashes[item.id]})
+            batch_tokens += tokens
+    if documents:
+        batches.append((ids, documents, metadatas))
+    return batches
+
+
+async def embed_batch(documents: List[str], metadatas: List[dict]) -> Optional[List[List[float]]]:
+    try:
+        return await gigachat_embedding_client.embed_documents(documents)
+    except Exception as e:
+        print(f"Error embedding items {sorted({metadata['id'] for metadata in metadatas})}: {e}")
+        return None
+
+
+async def store_embeddings(
+    collection: AsyncCollection,
+    changed_ids: List[str],
+    batches: List[Tuple[List[str], List[str], List[dict], List[List[float]]]],
+):
+    # the chunks of changed items are dropped first, their new text may split into fewer chunks
+    if changed_ids:
+        await collection.delete(where={'id': {'$in': changed_ids}})
+    failed_ids = set()
+    for ids, documents, metadatas, embeddings in batches:
         try:
-            for idx, cleaned_chunk in enumerate(clean_splits):
-                collection_clean.add(
-                    ids=[f"{item.id.replace('.txt', '_' + str(idx) + '.txt')}"],
-                    documents=[cleaned_chunk],
-                    metadatas=[{"part_index": idx, 'id': item.id}],
-                )
+            await collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
         except Exception as e:
-            print(f"Error processing item {item.id}: {e}")
+            failed_ids.update(metadata['id'] for metadata in metadatas)
+            print(f"Error storing items {sorted({metadata['id'] for metadata in metadatas})}: {e}")
+    # every chunk carries the content hash, so a partly stored item would be skipped as complete on the next sync
+    if failed_ids:
+        await collection.delete(where={'id': {'$in': sorted(failed_ids)}})
+
+
+async def embed_items(
+    items: List[EmbeddingRequest],
+    hashes: Dict[str, str],
+    concurrent: bool = False,
+) -> Tuple[Dict[str, List[List[float]]], List[Tuple[List[str], List[str], List[dict], List[List[float]]]]]:
+    chunk_batches = group_chunks(items, await preprocess_texts([item.text for item in items]), hashes)
+    if concurrent:
+        # the embedding executor bounds how many batches are in flight
+        embedded = await asyncio.gather(*[embed_batch(documents, metadatas) for _, documents, metadatas in chunk_batches])
+    else:
+        embedded = [await embed_batch(documents, metadatas) for _, documents, metadatas in tqdm(chunk_batches)]
+
+    failed_ids = {metadata['id'] for (_, _, metadatas), embeddings in zip(chunk_batches, embedded) if embeddings is None for metadata in metadatas}
+    vectors: Dict[str, List[List[float]]] = defaultdict(list)
+    batches = []
+    for (ids, documents, metadatas), embeddings in zip(chunk_batches, embedded):
+        if embeddings is None:
+            continue
+        # the caller still ranks by the chunks that did embed, but an item is only stored once all of its chunks are
+        stored = [idx for idx, metadata in enumerate(metadatas) if metadata['id'] not in failed_ids]
+        if stored:
+            batches.append((
+                [ids[idx] for idx in stored],
+                [documents[idx] for idx in stored],
+                [metadatas[idx] for idx in stored],
+                [embeddings[idx] for idx in stored],
+            ))
+        for metadata, embedding in zip(metadatas, embeddings):
+            vectors[metadata['id']].append(embedding)
+    return vectors, batches
+
+
+async def sync_embeddings(
+    request: List[EmbeddingRequest],
+    include_embeddings: bool = False,
+    on_request_path: bool = False,
+) -> Tuple[Dict[str, List[List[float]]], Dict[str, int]]:
+    # on the request path the batches are embedded concurrently and stored after returning
+    collection_clean = async_gigachat_rospatent_titles_collection
+
+    # repeated ids in one request are embedded once, with the text of their last occurrence
+    items = {item.id: item for item in request}
+    hashes = {id_: content_hash(item.text) for id_, item in items.items()}
+    embedded_chunks = await get_embedded_chunks(collection_clean, list(items), include_embeddings)
+
+    changed_ids = [id_ for id_ in items if id_ in embedded_chunks and embedded_chunks[id_][0] != hashes[id_]]
+    pending = [item for id_, item in items.items() if id_ not in embedded_chunks or embedded_chunks[id_][0] != hashes[id_]]
+
+    vectors = {id_: chunk_vectors for id_, (hash_, chunk_vectors) in embedded_chunks.items() if hash_ == hashes[id_]}
+    new_vectors, batches = await embed_items(pending, hashes, concurrent=on_request_path)
+    vectors.update(new_vectors)
+
+    if on_request_path:
+        task = asyncio.create_task(store_embeddings(collection_clean, changed_ids, batches))
+        _pending_stores.add(task)
+        task.add_done_callback(_pending_stores.discard)
+    else:
+        await store_embeddings(collection_clean, changed_ids, batches)
+
+    counts = {'embedded': len(pending), 'reembedded': len(changed_ids), 'skipped': len(items) - len(pending)}
+    return vectors, counts
+
+
+async def wait_for_pending_stores():
+    if _pending_stores:
+        await asyncio.gather(*_pending_stores, return_exceptions=True)
+
+
+async def domain_save_embeddings(
+    request: List[EmbeddingRequest],
+) -> Dict[str, int]:
+    _, counts = await sync_embeddings(request)
 
     print("Embeddings saved for both raw and cleaned texts.")
+    return counts
@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from embeddings.infrastructure.embeddings_config import embeddings_config
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+VECTORS_FILE = 'vectors.npy'
+RECORDS_FILE = 'records.json'
+
+
+def get_where_item_ids(where: Optional[Dict[str, Any]]) -> Optional[Set[str]]:
+    # only the filter the services actually send is supported: {'id': {'$in': [...]}} on the item id metadata
+    if not where:
+        return None
+    condition = where['id']
+    return set(condition['$in']) if isinstance(condition, dict) else {condition}
+
+
+class LocalVectorIndex:
+    # a float32 matrix memory-mapped from disk plus the chunk records in row order, queried with exact cosine
+    # similarity, it mirrors the part of the chroma Collection API used by this service
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._alive: Optional[np.ndarray] = None
+        self._records: List[Dict[str, Any]] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._rows_by_item: Dict[str, Set[int]] = {}
+        self._writes_since_persist = 0
+        self._hnsw = None
+        self.load()
+
+    def load(self):
+        vectors_path = os.path.join(self.path, VECTORS_FILE)
+        records_path = os.path.join(self.path, RECORDS_FILE)
+        if not os.path.exists(vectors_path) or not os.path.exists(records_path):
+            return
+        with open(records_path) as file:
+            records = json.load(file)
+        vectors = np.load(vectors_path, mmap_mode='r')
+        with self._lock:
+            self._set_rows(vectors, records)
+
+    def _set_rows(self, vectors: np.ndarray, records: List[Dict[str, Any]]):
+        self._vectors = vectors
+        self._norms = np.linalg.norm(vectors, axis=1) if len(vectors) else np.zeros(0, dtype=np.float32)
+        self._alive = np.ones(len(records), dtype=bool)
+        self._records = records
+        self._row_by_id = {record['id']: row for row, record in enumerate(records)}
+        self._rows_by_item = {}
+        for row, record in enumerate(records):
+            self._rows_by_item.setdefault(record['metadata']['id'], set()).add(row)
+        self._hnsw = None
+
+    def persist(self):
+        with self._lock:
+            if self._vectors is None:
+                return
+            alive_rows = np.flatnonzero(self._alive)
+            vectors = np.ascontiguousarray(self._vectors[alive_rows], dtype=np.float32)
+            records = [self._records[row] for row in alive_rows]
+
+            os.makedirs(self.path, exist_ok=True)
+            # written next to the live files and swapped in, so a crash never leaves a half written index behind
+            vectors_tmp_path = os.path.join(self.path, f'{VECTORS_FILE}.tmp')
+            records_tmp_path = os.path.join(self.path, f'{RECORDS_FILE}.tmp')
+            with open(vectors_tmp_path, 'wb') as file:
+                np.save(file, vectors)
+            with open(records_tmp_path, 'w') as file:
+                json.dump(records, file, ensure_ascii=False)
+            os.replace(vectors_tmp_path, os.path.join(self.path, VECTORS_FILE))
+            os.replace(records_tmp_path, os.path.join(self.path, RECORDS_FILE))
+
+            self._writes_since_persist = 0
+            self.load()
+
+    def _mark_written(self):
+        self._hnsw = None
+        self._writes_since_persist += 1
+        if self._writes_since_persist >= embeddings_config.LOCAL_INDEX_PERSIST_EVERY:
+            self.persist()
+
+    def _item_rows(self, item_ids: Optional[Set[str]]) -> np.ndarray:
+        if self._vectors is None:
+            return np.zeros(0, dtype=np.int64)
+        if item_ids is None:
+            return np.flatnonzero(self._alive)
+        rows = [row for item_id in item_ids for row in self._rows_by_item.get(item_id, ())]
+        return np.array(sorted(row for row in rows if self._alive[row]), dtype=np.int64)
+
+    def _row_vectors(self, rows: np.ndarray) -> List[List[float]]:
+        # an index nothing has been written to yet has no matrix to take rows from
+        return self._vectors[rows].tolist() if self._vectors is not None else []
+
+    def get(self, where: Optional[Dict[str, Any]] = None, include: Optional[List[str]] = None, **kwargs) -> Dict[str, Any]:
+        include = include if include is not None else ['metadatas', 'documents']
+        with self._lock:
+            rows = self._item_rows(get_where_item_ids(where))
+            return {
+                'ids': [self._records[row]['id'] for row in rows],
+                'metadatas': [self._records[row]['metadata'] for row in rows] if 'metadatas' in include else None,
+                'documents': [self._records[row]['document'] for row in rows] if 'documents' in include else None,
+                'embeddings': self._row_vectors(rows) if 'embeddings' in include else None,
+            }
+
+    def delete(self, where: Optional[Dict[str, Any]] = None, **kwargs):
+        with self._lock:
+            rows = self._item_rows(get_where_item_ids(where))
+            if not len(rows):
+                return
+            self._alive[rows] = False
+            self._mark_written()
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]], **kwargs):
+        new_vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            existing_rows = [self._row_by_id[id_] for id_ in ids if id_ in self._row_by_id]
+            if existing_rows:
+                self._alive[existing_rows] = False
+
+            first_row = len(self._records)
+            # the memory map is read only, the first write copies the matrix into memory until the next persist
+            if self._vectors is None:
+                self._vectors = new_vectors
+                self._norms = np.linalg.norm(new_vectors, axis=1)
+                self._alive = np.ones(len(ids), dtype=bool)
+            else:
+                self._vectors = np.concatenate([self._vectors, new_vectors])
+                self._norms = np.concatenate([self._norms, np.linalg.norm(new_vectors, axis=1)])
+                self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+
+            for offset, (id_, document, metadata) in enumerate(zip(ids, documents, metadatas)):
+                row = first_row + offset
+                self._records.append({'id': id_, 'document': document, 'metadata': metadata})
+                self._row_by_id[id_] = row
+                self._rows_by_item.setdefault(metadata['id'], set()).add(row)
+            self._mark_written()
+
+    def _get_hnsw(self):
+        if self._hnsw is None:
+            rows = np.flatnonzero(self._alive)
+            index = hnswlib.Index(space='cosine', dim=self._vectors.shape[1])
+            index.init_index(max_elements=max(len(rows), 1))
+            if len(rows):
+                index.add_items(np.asarray(self._vectors[rows], dtype=np.float32), rows)
+            index.set_ef(embeddings_config.LOCAL_INDEX_HNSW_EF)
+            self._hnsw = index
+        return self._hnsw
+
+    def _search(self, query: np.ndarray, rows: np.ndarray, n_results: int, filtered: bool):
+        if embeddings_config.LOCAL_INDEX_HNSW and hnswlib is not None and not filtered:
+            # filtered queries touch a handful of rows and stay exact, the graph only serves full scans
+            k = min(n_results, len(rows))
+            labels, distances = self._get_hnsw().knn_query(query, k=k)
+            return labels[0].astype(np.int64), distances[0]
+
+        similarities = (self._vectors[rows] @ query) / (self._norms[rows] * (np.linalg.norm(query) or 1.0) + 1e-12)
+        k = min(n_results, len(rows))
+        top = np.argpartition(-similarities, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(-similarities[top])]
+        return rows[top], 1.0 - similarities[top]
+
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        include = include if include is not None else ['metadatas', 'documents', 'distances']
+        result = {'ids': [], 'distances': [], 'metadatas': [], 'documents': [], 'embeddings': []}
+        with self._lock:
+            item_ids = get_where_item_ids(where)
+            rows = self._item_rows(item_ids)
+            for query_embedding in query_embeddings:
+                if len(rows) and n_results > 0:
+                    found_rows, distances = self._search(np.asarray(query_embedding, dtype=np.float32), rows, n_results, item_ids is not None)
+                else:
+                    found_rows, distances = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+                result['ids'].append([self._records[row]['id'] for row in found_rows])
+                result['distances'].append([float(distance) for distance in distances])
+                result['metadatas'].append([self._records[row]['metadata'] for row in found_rows])
+                result['documents'].append([self._records[row]['document'] for row in found_rows])
+                result['embeddings'].append(self._row_vectors(found_rows))
+        return {key: (value if key == 'ids' or key in include else None) for key, value in result.items()}
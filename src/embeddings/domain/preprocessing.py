@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+import tiktoken
+from cleantext import clean
+
+from embeddings.infrastructure.embeddings_config import embeddings_config
+
+encoding = tiktoken.encoding_for_model('text-embedding-3-large')
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def clean_text(text: str) -> str:
+    text_clean = clean(
+        text,
+        fix_unicode=True,
+        to_ascii=False,
+        lower=True,
+        normalize_whitespace=True,
+        no_line_breaks=True,
+        strip_lines=True,
+        keep_two_line_breaks=False,
+        no_urls=True,
+        no_emails=True,
+        no_phone_numbers=True,
+        no_numbers=True,
+        no_digits=True,
+        no_currency_symbols=True,
+        no_punct=True,
+        no_emoji=True,
+        replace_with_url="<ссылка>",
+        replace_with_email="<почта>",
+        replace_with_phone_number="<телефон>",
+        replace_with_number="",
+        replace_with_digit="",
+        replace_with_currency_symbol="<валюта>",
+        replace_with_punct="",
+        lang="en",
+    )
+    return "".join([c for c in text_clean if c.isalpha() or c.isspace()])
+
+
+def preprocess_text(text: str) -> List[Tuple[str, int]]:
+    # token windows without overlap, the same split TokenTextSplitter produced, with the token count of every chunk
+    tokens = encoding.encode(clean_text(text))
+    chunks = []
+    for start in range(0, len(tokens), embeddings_config.CHUNK_TOKENS):
+        chunk_tokens = tokens[start:start + embeddings_config.CHUNK_TOKENS]
+        chunks.append((encoding.decode(chunk_tokens), len(chunk_tokens)))
+    return chunks
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=embeddings_config.PREPROCESS_WORKERS)
+    return _executor
+
+
+async def preprocess_texts(texts: Iterable[str]) -> List[List[Tuple[str, int]]]:
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*[loop.run_in_executor(get_executor(), preprocess_text, text) for text in texts])
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
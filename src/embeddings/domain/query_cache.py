@@ -0,0 +1,78 @@
+import hashlib
+from array import array
+from typing import Dict, List, Optional
+
+from common.utils.cache import LRUCache
+from embeddings.domain.clients import AsyncEmbeddingClient
+from embeddings.infrastructure.embeddings_config import embeddings_config
+from redis.config import redis_config
+from redis.redis import RedisProvider
+
+local_query_embedding_cache: LRUCache[str, bytes] = LRUCache(embeddings_config.QUERY_CACHE_MAX_SIZE)
+
+shared_query_embedding_cache_metrics = {'hits': 0, 'misses': 0, 'errors': 0}
+
+
+def normalize_query(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def make_query_embedding_key(model: str, text: str) -> str:
+    return f'query_embedding:{model}:{hashlib.sha256(normalize_query(text).encode()).hexdigest()}'
+
+
+def pack_embedding(embedding: List[float]) -> bytes:
+    # float32 is what the vector store keeps anyway, at a quarter of the size of a JSON list
+    return array('f', embedding).tobytes()
+
+
+def unpack_embedding(raw: bytes) -> List[float]:
+    embedding = array('f')
+    embedding.frombytes(raw)
+    return embedding.tolist()
+
+
+async def get_shared_embedding(key: str) -> Optional[bytes]:
+    if not redis_config.ENABLED:
+        return None
+    try:
+        redis = await RedisProvider.get_redis()
+        raw = await redis.get(key)
+    except Exception as e:
+        shared_query_embedding_cache_metrics['errors'] += 1
+        print(f"Error while reading query embedding cache {key=}: {e!r}")
+        return None
+    shared_query_embedding_cache_metrics['hits' if raw is not None else 'misses'] += 1
+    return raw
+
+
+async def set_shared_embedding(key: str, raw: bytes):
+    if not redis_config.ENABLED:
+        return
+    try:
+        redis = await RedisProvider.get_redis()
+        await redis.set(key, raw, expire=embeddings_config.QUERY_CACHE_EXPIRE)
+    except Exception as e:
+        shared_query_embedding_cache_metrics['errors'] += 1
+        print(f"Error while writing query embedding cache {key=}: {e!r}")
+
+
+async def embed_query_cached(client: AsyncEmbeddingClient, text: str) -> List[float]:
+    key = make_query_embedding_key(client.model, text)
+
+    raw = local_query_embedding_cache.get(key)
+    if raw is None:
+        raw = await get_shared_embedding(key)
+        if raw is None:
+            embeddings = await client.embed_documents([normalize_query(text)])
+            raw = pack_embedding(embeddings[0])
+            await set_shared_embedding(key, raw)
+        local_query_embedding_cache.set(key, raw)
+    return unpack_embedding(raw)
+
+
+def get_query_embedding_cache_metrics() -> Dict[str, Dict[str, int]]:
+    return {
+        'local': local_query_embedding_cache.metrics(),
+        'shared': dict(shared_query_embedding_cache_metrics),
+    }
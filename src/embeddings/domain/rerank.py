@@ -0,0 +1,36 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from embeddings.api.schema import RerankRequest, RerankResponse
+from embeddings.domain.embeddings import gigachat_embedding_client, sync_embeddings
+from embeddings.domain.query_cache import embed_query_cached
+
+
+def rank_by_cosine(query: List[float], ids: List[str], vectors: Dict[str, List[List[float]]]) -> RerankResponse:
+    # an item scores as its best matching chunk, the same item a nearest neighbour query over chunks would return first
+    owners = [owner for owner, id_ in enumerate(ids) for _ in vectors.get(id_, ())]
+    scores: List[Optional[float]] = [None] * len(ids)
+    if owners:
+        matrix = np.asarray([vector for id_ in ids for vector in vectors.get(id_, ())], dtype=np.float32)
+        query_vector = np.asarray(query, dtype=np.float32)
+        similarities = (matrix @ query_vector) / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector) + 1e-12)
+        best = np.full(len(ids), -np.inf, dtype=np.float32)
+        np.maximum.at(best, np.asarray(owners), similarities)
+        scores = [float(score) if np.isfinite(score) else None for score in best]
+
+    # candidates without an embedding keep their relative order after the ranked ones
+    order = sorted(range(len(ids)), key=lambda index: (scores[index] is None, -(scores[index] or 0.0), index))
+    return RerankResponse(ids=[ids[index] for index in order], scores=[scores[index] for index in order])
+
+
+async def rerank_candidates(request: RerankRequest) -> RerankResponse:
+    candidates = [candidate for candidate in request.candidates if candidate.text.strip()]
+    query, (vectors, _) = await asyncio.gather(
+        embed_query_cached(gigachat_embedding_client, request.text),
+        sync_embeddings(candidates, include_embeddings=True, on_request_path=True),
+    )
+
+    ids = list(dict.fromkeys(candidate.id for candidate in request.candidates))
+    return rank_by_cosine(query, ids, vectors)
@@ -0,0 +1,31 @@
+from typing import Literal
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class EmbeddingsConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix='EMBEDDINGS_')
+
+    CHUNK_TOKENS: int = Field(4096, ge=1)
+    PREPROCESS_WORKERS: int = Field(2, ge=1)
+    BATCH_MAX_CHUNKS: int = Field(16, ge=1)
+    BATCH_MAX_TOKENS: int = Field(32768, ge=1)
+
+    EMBEDDING_MAX_WORKERS: int = Field(4, ge=1)
+    EMBEDDING_TIMEOUT: float = Field(60)
+    VECTOR_STORE_MAX_WORKERS: int = Field(8, ge=1)
+    VECTOR_STORE_TIMEOUT: float = Field(30)
+
+    QUERY_CACHE_MAX_SIZE: int = Field(10000, ge=1)
+    QUERY_CACHE_EXPIRE: int = Field(7 * 24 * 3600)
+
+    # the local index lives inside the worker process, it needs a single gunicorn worker to stay consistent
+    VECTOR_STORE: Literal['chroma', 'local'] = Field('chroma')
+    LOCAL_INDEX_PATH: str = Field('/opt/app-root/data/vector_index')
+    LOCAL_INDEX_PERSIST_EVERY: int = Field(20, ge=1)
+    LOCAL_INDEX_HNSW: bool = Field(False)
+    LOCAL_INDEX_HNSW_EF: int = Field(64, ge=1)
+
+
+embeddings_config = EmbeddingsConfig()
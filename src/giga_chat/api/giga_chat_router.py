@@ -1,100 +1,55 @@
-from typing import Callable, List, Tuple
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
 from asyncpg import Connection
-from fastapi import APIRouter, Depends, HTTPException, Query
-from langchain.chains.summarize import load_summarize_chain
-from langchain.prompts import PromptTemplate
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-from langchain_core.messages import HumanMessage, SystemMessage
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
 
 from common.api.dependencies import get_db_connection
-from common.db.model import get_many_sber_all_title_ru, get_patent_abstract, get_patent_abstract_and_summary, get_patent_all_and_summary, get_patent_claims, get_patent_claims_and_summary, get_patent_description, get_patent_description_and_summary, get_patent_snippet, get_patent_snippet_and_summary, save_patent_abstract_summary, save_patent_all_summary, save_patent_claims_summary, save_patent_description_summary, save_patent_snippet_summary
+from common.api.disconnect import run_until_disconnected
+from common.db.model import get_many_sber_all_title_ru
 from common.utils.debug import async_timer
-from giga_chat.domain.llm import giga_chat_llm
+from giga_chat.domain.llm import ainvoke_llm
+from giga_chat.domain.summary_jobs import PatentContentNotFoundError, SummaryJob, SummarySection, get_summary_job_state, stream_summary_job, submit_summary_job, wait_for_summary_job
+from giga_chat.infrastructure.config import giga_chat_api_config
+from redis.patent_cache import get_cached_patent, get_patent_cache_metrics
 
 giga_chat_router = APIRouter(
     prefix="/giga_chat",
     tags=["Giga Chat"],
 )
 
-map_prompt_template = PromptTemplate(
-    input_variables=['text'],
-    template='''Резюмируй следующий текст на русском в ясной и сжатой форме:
-текст:`{text}`
-Краткое содержание:
-'''
-)
-
-combine_prompt_template = PromptTemplate(
-    input_variables=['text'],
-    template='''
-Объедините следующие краткие содержания в одно полное обобщение в стиле страницы Википедии. Резюме должно быть согласованным, информативным и фактическим, эффективно интегрируя все ключевые моменты отдельных кратких содержаний:
-текст:`{text}`
-Краткое содержание:
-'''
-)
-
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=7000,
-    chunk_overlap=0,
-    length_function=len,
-    is_separator_regex=False,
-)
-
-chain = load_summarize_chain(
-    llm=giga_chat_llm,
-    chain_type="map_reduce",
-    map_prompt=map_prompt_template,
-    combine_prompt=combine_prompt_template,
-    verbose=True
-)
 
+async def invoke_llm(messages: List[BaseMessage]) -> BaseMessage:
+    try:
+        return await ainvoke_llm(messages)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="GigaChat did not respond in time")
 
-def clean_title(title):
-    title = title.strip()
-    if title.startswith('"') or title.startswith("'") or title.startswith('«'):
-        title = title[1:]
-    if title.endswith('"') or title.endswith("'") or title.endswith('»'):
-        title = title[:-1]
-    return title
-
-
-async def generate_summary_and_save(
-    get_patent_content: Callable,
-    save_function: Callable,
-    db: Connection,
-    patent_id: str
-) -> Tuple[str, str]:
-    patent_result = await get_patent_content(db, patent_id)
-    patent_content, summarized_title, summarized_content = patent_result
-
-    if not patent_content:
-        raise HTTPException(status_code=404, detail="Patent content not found")
-
-    if summarized_title and summarized_content:
-        return summarized_title, summarized_content
 
-    documents = text_splitter.split_documents([Document(page_content=patent_content)])
-
-    summary = await chain.arun(documents)
-
-    if not summary:
+def summary_job_result(job: SummaryJob) -> Tuple[str, str]:
+    if job.status == 'failed':
         raise HTTPException(status_code=404, detail="Summary not generated successfully")
+    if job.status != 'done':
+        # the job keeps running, repeating the request or polling /summary_job picks the result up later
+        raise HTTPException(status_code=504, detail="Summary not generated in time")
+    return job.title, job.summary
 
-    messages = [
-        SystemMessage(content="Перед тобой технический текст. Придумай к нему технический заголовок отражающий его суть, указав специфические области или дисциплины к которым относится текст"),
-        HumanMessage(content=summary)
-    ]
 
-    response = giga_chat_llm(messages)
-
-    title = clean_title(response.content)
+async def get_section_summary(request: Request, patent_id: str, section: SummarySection) -> Tuple[str, str]:
+    try:
+        job = await run_until_disconnected(request, wait_for_summary_job(patent_id, section, giga_chat_api_config.SUMMARY_TIMEOUT))
+    except PatentContentNotFoundError:
+        raise HTTPException(status_code=404, detail="Patent content not found")
+    return summary_job_result(job)
 
-    await save_function(db, patent_id, title, summary)
 
-    return title, summary
+async def format_events(events: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> AsyncIterator[str]:
+    async for event, data in events:
+        yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 
 class TitleSummaryRuRequest(BaseModel):
@@ -114,14 +69,12 @@ async def get_description_original(
     query: TitleSummaryRuRequest = Depends(),
     db: Connection = Depends(get_db_connection),
 ):
-    title_description = await get_patent_description(connection=db, patent_id=query.patent_id)
+    patent = await get_cached_patent(db, query.patent_id)
 
-    if not title_description:
+    if not patent:
         raise HTTPException(status_code=404, detail="Original patent data not found")
 
-    title, description = title_description
-
-    return title, description
+    return patent.title_ru, patent.description_ru
 
 
 @giga_chat_router.get(
@@ -130,15 +83,10 @@ async def get_description_original(
 )
 @async_timer
 async def get_description_summary(
+    request: Request,
     query: TitleSummaryRuRequest = Depends(),
-    db: Connection = Depends(get_db_connection),
 ):
-    return await generate_summary_and_save(
-        get_patent_description_and_summary,
-        save_patent_description_summary,
-        db,
-        query.patent_id
-    )
+    return await get_section_summary(request, query.patent_id, SummarySection.DESCRIPTION)
 
 
 @giga_chat_router.get(
@@ -150,13 +98,12 @@ async def get_snippet_original(
     query: TitleSummaryRuRequest = Depends(),
     db: Connection = Depends(get_db_connection),
 ):
-    snippet_data = await get_patent_snippet(connection=db, patent_id=query.patent_id)
+    patent = await get_cached_patent(db, query.patent_id)
 
-    if not snippet_data:
+    if not patent:
         raise HTTPException(status_code=404, detail="Original patent snippet not found")
 
-    title, snippet = snippet_data
-    return title, snippet
+    return patent.title_ru, patent.snippet_ru
 
 
 @giga_chat_router.get(
@@ -165,15 +112,10 @@ async def get_snippet_original(
 )
 @async_timer
 async def get_snippet_summary(
+    request: Request,
     query: TitleSummaryRuRequest = Depends(),
-    db: Connection = Depends(get_db_connection),
 ):
-    return await generate_summary_and_save(
-        get_patent_snippet_and_summary,
-        save_patent_snippet_summary,
-        db,
-        query.patent_id
-    )
+    return await get_section_summary(request, query.patent_id, SummarySection.SNIPPET)
 
 
 # abstract
@@ -186,13 +128,12 @@ async def get_abstract_original(
     query: TitleSummaryRuRequest = Depends(),
     db: Connection = Depends(get_db_connection),
 ):
-    abstract_data = await get_patent_abstract(connection=db, patent_id=query.patent_id)
+    patent = await get_cached_patent(db, query.patent_id)
 
-    if not abstract_data:
+    if not patent:
         raise HTTPException(status_code=404, detail="Original patent abstract not found")
 
-    title, abstract = abstract_data
-    return title, abstract
+    return patent.title_ru, patent.abstract_ru
 
 
 @giga_chat_router.get(
@@ -201,15 +142,10 @@ async def get_abstract_original(
 )
 @async_timer
 async def get_abstract_summary(
+    request: Request,
     query: TitleSummaryRuRequest = Depends(),
-    db: Connection = Depends(get_db_connection),
 ):
-    return await generate_summary_and_save(
-        get_patent_abstract_and_summary,
-        save_patent_abstract_summary,
-        db,
-        query.patent_id
-    )
+    return await get_section_summary(request, query.patent_id, SummarySection.ABSTRACT)
 
 
 @giga_chat_router.get(
@@ -221,14 +157,12 @@ async def get_claims_original(
     query: TitleSummaryRuRequest = Depends(),
     db: Connection = Depends(get_db_connection),
 ):
-    title_claims = await get_patent_claims(connection=db, patent_id=query.patent_id)
+    patent = await get_cached_patent(db, query.patent_id)
 
-    if not title_claims:
+    if not patent:
         raise HTTPException(status_code=404, detail="Original patent claims not found")
 
-    title, claims = title_claims
-
-    return title, claims
+    return patent.title_ru, patent.claims_ru
 
 
 @giga_chat_router.get(
@@ -237,15 +171,10 @@ async def get_claims_original(
 )
 @async_timer
 async def get_claims_summary(
+    request: Request,
     query: TitleSummaryRuRequest = Depends(),
-    db: Connection = Depends(get_db_connection),
 ):
-    return await generate_summary_and_save(
-        get_patent_claims_and_summary,
-        save_patent_claims_summary,
-        db,
-        query.patent_id
-    )
+    return await get_section_summary(request, query.patent_id, SummarySection.CLAIMS)
 
 
 @giga_chat_router.get(
@@ -254,15 +183,10 @@ async def get_claims_summary(
 )
 @async_timer
 async def get_all_summary(
+    request: Request,
     query: TitleSummaryRuRequest = Depends(),
-    db: Connection = Depends(get_db_connection),
 ):
-    return await generate_summary_and_save(
-        get_patent_all_and_summary,
-        save_patent_all_summary,
-        db,
-        query.patent_id
-    )
+    return await get_section_summary(request, query.patent_id, SummarySection.ALL)
 
 
 @giga_chat_router.get(
@@ -271,6 +195,7 @@ async def get_all_summary(
 )
 @async_timer
 async def get_cluster_title(
+    request: Request,
     query: SearchOneRequest = Depends(),
     db: Connection = Depends(get_db_connection),
 ):
@@ -282,7 +207,7 @@ async def get_cluster_title(
             content="Перед тобой несколько заголовков. Выдели основную мысль, и сформулирую облать к которой относятся данные заголовки."),
         HumanMessage(content=text)
     ]
-    response = giga_chat_llm(messages)
+    response = await run_until_disconnected(request, invoke_llm(messages))
 
     if not response.content:
         raise HTTPException(status_code=404, detail="Summary not generated successfully")
@@ -291,6 +216,47 @@ async def get_cluster_title(
     return title
 
 
+class SummaryJobRequest(BaseModel):
+    patent_id: str
+    section: SummarySection
+    timeout: float = Field(0, ge=0)
+
+
+@giga_chat_router.get(
+    "/summary_job",
+    response_model_exclude_none=True,
+)
+@async_timer
+async def get_summary_job_status(
+    request: Request,
+    query: SummaryJobRequest = Depends(),
+) -> SummaryJob:
+    try:
+        if not query.timeout:
+            return await submit_summary_job(query.patent_id, query.section)
+        return await run_until_disconnected(request, wait_for_summary_job(query.patent_id, query.section, query.timeout))
+    except PatentContentNotFoundError:
+        raise HTTPException(status_code=404, detail="Patent content not found")
+
+
+@giga_chat_router.get(
+    "/{section}_summary/stream",
+)
+async def stream_section_summary(
+    section: SummarySection,
+    query: TitleSummaryRuRequest = Depends(),
+) -> StreamingResponse:
+    try:
+        job = await get_summary_job_state(query.patent_id, section)
+    except PatentContentNotFoundError:
+        raise HTTPException(status_code=404, detail="Patent content not found")
+    return StreamingResponse(
+        format_events(stream_summary_job(job)),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 class ExtendedQueryRequest(BaseModel):
     text: str
 
@@ -301,11 +267,21 @@ class ExtendedQueryRequest(BaseModel):
 )
 @async_timer
 async def get_extended_query(
+    request: Request,
     query: ExtendedQueryRequest = Depends(),
 ):
     messages = [
         SystemMessage(content="Перед тобой запрос, добавь в него ключевые слова подходящие по теме"),
         HumanMessage(content=query.text)
     ]
-    response = giga_chat_llm(messages)
+    response = await run_until_disconnected(request, invoke_llm(messages))
     return response.content
+
+
+@giga_chat_router.get(
+    '/metrics'
+)
+async def metrics():
+    return {
+        'patent_cache': get_patent_cache_metrics(),
+    }
@@ -0,0 +1,22 @@
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from common.api.lifespan import lifespan as common_lifespan
+from giga_chat.domain.summary_jobs import SummaryWorkerPool
+from redis.config import redis_config
+from redis.redis import RedisProvider
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with common_lifespan(app):
+        if redis_config.ENABLED:
+            await RedisProvider.setup()
+        await SummaryWorkerPool.setup()
+
+        yield
+
+        await SummaryWorkerPool.teardown()
+        if redis_config.ENABLED:
+            await RedisProvider.teardown()
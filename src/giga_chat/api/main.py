@@ -1,9 +1,9 @@
 from fastapi import FastAPI
 from starlette.responses import RedirectResponse
 
-from common.api.lifespan import lifespan
 from common.api.middleware import configure_cors
 from giga_chat.api.giga_chat_router import giga_chat_router
+from giga_chat.api.lifespan import lifespan
 
 app = FastAPI(
     debug=True,
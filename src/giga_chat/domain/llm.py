@@ -1,4 +1,8 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
 from langchain.chat_models.gigachat import GigaChat
+from langchain_core.messages import BaseMessage
 
 from giga_chat.infrastructure.config import giga_chat_api_config
 
@@ -6,5 +10,31 @@ giga_chat_llm = GigaChat(
     credentials=giga_chat_api_config.TOKEN,
     scope=giga_chat_api_config.SCOPE,
     verify_ssl_certs=False,
-    timeout=120,
+    timeout=giga_chat_api_config.TIMEOUT,
 )
+
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(giga_chat_api_config.MAX_CONCURRENCY)
+    return _llm_semaphore
+
+
+async def ainvoke_llm(messages: List[BaseMessage]) -> BaseMessage:
+    async with get_llm_semaphore():
+        return await asyncio.wait_for(giga_chat_llm.ainvoke(messages), giga_chat_api_config.CALL_TIMEOUT)
+
+
+async def astream_llm(messages: List[BaseMessage], on_token: Callable[[str], Awaitable[None]]) -> str:
+    async def stream() -> str:
+        parts = []
+        async for chunk in giga_chat_llm.astream(messages):
+            parts.append(chunk.content)
+            await on_token(chunk.content)
+        return ''.join(parts)
+
+    async with get_llm_semaphore():
+        return await asyncio.wait_for(stream(), giga_chat_api_config.CALL_TIMEOUT)
@@ -0,0 +1,133 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+import tiktoken
+
+from langchain.prompts import PromptTemplate
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.messages import HumanMessage
+
+from giga_chat.domain.llm import ainvoke_llm, astream_llm
+from giga_chat.infrastructure.config import giga_chat_api_config
+
+ProgressCallback = Callable[[str, int, int], Awaitable[None]]
+TokenCallback = Callable[[str], Awaitable[None]]
+
+map_prompt_template = PromptTemplate(
+    input_variables=['text'],
+    template='''Резюмируй следующий текст на русском в ясной и сжатой форме:
+текст:`{text}`
+Краткое содержание:
+'''
+)
+
+combine_prompt_template = PromptTemplate(
+    input_variables=['text'],
+    template='''
+Объедините следующие краткие содержания в одно полное обобщение в стиле страницы Википедии. Резюме должно быть согласованным, информативным и фактическим, эффективно интегрируя все ключевые моменты отдельных кратких содержаний:
+текст:`{text}`
+Краткое содержание:
+'''
+)
+
+encoding = tiktoken.get_encoding(giga_chat_api_config.SUMMARY_TOKEN_ENCODING)
+
+
+def count_tokens(text: str) -> int:
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=giga_chat_api_config.SUMMARY_CHUNK_TOKENS,
+    chunk_overlap=0,
+    length_function=count_tokens,
+    is_separator_regex=False,
+)
+
+
+async def complete(prompt_template: PromptTemplate, text: str, on_token: Optional[TokenCallback] = None) -> str:
+    messages = [HumanMessage(content=prompt_template.format(text=text))]
+    if on_token is not None:
+        return await astream_llm(messages, on_token)
+    response = await ainvoke_llm(messages)
+    return response.content
+
+
+async def run_stage(
+    stage: str,
+    prompt_template: PromptTemplate,
+    texts: List[str],
+    on_progress: Optional[ProgressCallback],
+) -> List[str]:
+    # bounded per summary on top of the global llm limit, so one long patent can not take every slot
+    semaphore = asyncio.Semaphore(giga_chat_api_config.SUMMARY_MAP_CONCURRENCY)
+    done = 0
+
+    async def run_one(text: str) -> str:
+        nonlocal done
+        async with semaphore:
+            result = await complete(prompt_template, text)
+        done += 1
+        if on_progress is not None:
+            await on_progress(stage, done, len(texts))
+        return result
+
+    return list(await asyncio.gather(*[run_one(text) for text in texts]))
+
+
+def group_by_budget(summaries: List[str], max_tokens: int) -> List[List[str]]:
+    groups: List[List[str]] = []
+    group_tokens = 0
+    for summary in summaries:
+        tokens = count_tokens(summary)
+        if not groups or group_tokens + tokens > max_tokens:
+            groups.append([])
+            group_tokens = 0
+        groups[-1].append(summary)
+        group_tokens += tokens
+    return groups
+
+
+async def collapse_summaries(
+    summaries: List[str],
+    on_progress: Optional[ProgressCallback],
+) -> List[str]:
+    # tree reduction, every level combines budget sized groups concurrently until everything fits one combine call
+    level = 0
+    while len(summaries) > 1 and sum(count_tokens(summary) for summary in summaries) > giga_chat_api_config.SUMMARY_REDUCE_MAX_TOKENS:
+        groups = group_by_budget(summaries, giga_chat_api_config.SUMMARY_REDUCE_MAX_TOKENS)
+        if len(groups) == len(summaries):
+            # every summary fills the budget alone, combining further would not shrink anything
+            break
+        level += 1
+        summaries = await run_stage(f'collapse_{level}', combine_prompt_template, ['\n\n'.join(group) for group in groups], on_progress)
+    return summaries
+
+
+async def summarize_text(
+    text: str,
+    on_progress: Optional[ProgressCallback] = None,
+    summaries: Sequence[str] = (),
+    on_token: Optional[TokenCallback] = None,
+) -> str:
+    # summaries that already exist (e.g. of other sections) skip the map stage and join the reduction directly
+    chunks = text_splitter.split_text(text) if text else []
+    if not chunks and not summaries:
+        return ''
+
+    if len(chunks) == 1 and not summaries:
+        # the only map call is the final summary, so it is the one streamed
+        summary = await complete(map_prompt_template, chunks[0], on_token)
+        if on_progress is not None:
+            await on_progress('map', 1, 1)
+        return summary
+
+    summaries = list(summaries) + await run_stage('map', map_prompt_template, chunks, on_progress)
+    if len(summaries) == 1:
+        return summaries[0]
+
+    summaries = await collapse_summaries(summaries, on_progress)
+    summary = await complete(combine_prompt_template, '\n\n'.join(summaries), on_token)
+    if on_progress is not None:
+        await on_progress('reduce', 1, 1)
+    return summary
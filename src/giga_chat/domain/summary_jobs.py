@@ -0,0 +1,342 @@
+import asyncio
+import time
+from enum import Enum
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Sequence, Set, Tuple, TypeVar
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import BaseModel
+
+from common.db.db import DatabaseProvider
+from common.db.model import claim_summary_job, enqueue_claimed_summary_job, enqueue_summary_job, finish_summary_job, get_patent_abstract_and_summary, get_patent_all_and_summary, get_patent_claims_and_summary, get_patent_description_and_summary, get_patent_section_summaries, get_patent_snippet_and_summary, get_summary_job, renew_summary_job_lease, save_patent_abstract_summary, save_patent_all_summary, save_patent_claims_summary, save_patent_description_summary, save_patent_snippet_summary
+from giga_chat.domain.llm import ainvoke_llm
+from giga_chat.domain.summarization import ProgressCallback, TokenCallback, summarize_text
+from giga_chat.infrastructure.config import giga_chat_api_config
+from redis.patent_cache import invalidate_patents
+
+
+T = TypeVar('T')
+
+
+class SummarySection(str, Enum):
+    DESCRIPTION = 'description'
+    SNIPPET = 'snippet'
+    ABSTRACT = 'abstract'
+    CLAIMS = 'claims'
+    ALL = 'all'
+
+
+SECTION_FUNCTIONS = {
+    SummarySection.DESCRIPTION: (get_patent_description_and_summary, save_patent_description_summary),
+    SummarySection.SNIPPET: (get_patent_snippet_and_summary, save_patent_snippet_summary),
+    SummarySection.ABSTRACT: (get_patent_abstract_and_summary, save_patent_abstract_summary),
+    SummarySection.CLAIMS: (get_patent_claims_and_summary, save_patent_claims_summary),
+    SummarySection.ALL: (get_patent_all_and_summary, save_patent_all_summary),
+}
+
+FINISHED_STATUSES = ('done', 'failed')
+
+
+class PatentContentNotFoundError(Exception):
+    pass
+
+
+class SummaryNotGeneratedError(Exception):
+    pass
+
+
+class SummaryJob(BaseModel):
+    patent_id: str
+    section: SummarySection
+    status: str
+    title: Optional[str] = None
+    summary: Optional[str] = None
+    error: Optional[str] = None
+
+
+_wakeup: Optional[asyncio.Event] = None
+_finished: Dict[Tuple[str, str], asyncio.Event] = {}
+_detached_jobs: Set[asyncio.Task] = set()
+
+
+def get_wakeup_event() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+
+def clean_title(title):
+    title = title.strip()
+    if title.startswith('"') or title.startswith("'") or title.startswith('«'):
+        title = title[1:]
+    if title.endswith('"') or title.endswith("'") or title.endswith('»'):
+        title = title[:-1]
+    return title
+
+
+def print_progress(patent_id: str):
+    async def on_progress(stage: str, done: int, total: int):
+        print(f"Summary of {patent_id}: {stage} {done}/{total}")
+    return on_progress
+
+
+async def generate_summary(
+    patent_id: str,
+    patent_content: str,
+    section_summaries: Sequence[str] = (),
+    on_progress: Optional[ProgressCallback] = None,
+    on_token: Optional[TokenCallback] = None,
+) -> Tuple[str, str]:
+    summary = await asyncio.wait_for(
+        summarize_text(patent_content, on_progress=on_progress or print_progress(patent_id), summaries=section_summaries, on_token=on_token),
+        giga_chat_api_config.SUMMARY_TIMEOUT,
+    )
+
+    if not summary:
+        raise SummaryNotGeneratedError("Summary not generated successfully")
+
+    messages = [
+        SystemMessage(content="Перед тобой технический текст. Придумай к нему технический заголовок отражающий его суть, указав специфические области или дисциплины к которым относится текст"),
+        HumanMessage(content=summary)
+    ]
+
+    response = await ainvoke_llm(messages)
+
+    return clean_title(response.content), summary
+
+
+async def run_summary_job(
+    patent_id: str,
+    section: SummarySection,
+    on_progress: Optional[ProgressCallback] = None,
+    on_token: Optional[TokenCallback] = None,
+):
+    get_patent_content, save_function = SECTION_FUNCTIONS[section]
+    pool = await DatabaseProvider.get_pool()
+
+    # connections are only held around the queries, never across the minutes long llm calls
+    async with pool.acquire() as connection:
+        patent_result = await get_patent_content(connection, patent_id)
+    if not patent_result or not patent_result[0]:
+        raise PatentContentNotFoundError("Patent content not found")
+
+    patent_content, summarized_title, summarized_content = patent_result
+    if summarized_title and summarized_content:
+        return
+
+    section_summaries: List[str] = []
+    if section is SummarySection.ALL:
+        # sections users already opened are composed from their summaries, only the rest is summarized from source
+        async with pool.acquire() as connection:
+            sections = await get_patent_section_summaries(connection, patent_id)
+        sections = sections or []
+        section_summaries = [summary for content, summary in sections if content and summary]
+        patent_content = ' '.join(content for content, summary in sections if content and not summary)
+
+    title, summary = await generate_summary(patent_id, patent_content, section_summaries, on_progress, on_token)
+
+    async with pool.acquire() as connection:
+        await save_function(connection, patent_id, title, summary)
+    await invalidate_patents([patent_id])
+
+
+async def process_next_summary_job() -> bool:
+    pool = await DatabaseProvider.get_pool()
+    async with pool.acquire() as connection:
+        claimed = await claim_summary_job(connection, giga_chat_api_config.SUMMARY_JOB_LEASE)
+    if claimed is None:
+        return False
+
+    patent_id, section, attempts = claimed
+    await execute_summary_job(patent_id, SummarySection(section), attempts)
+    return True
+
+
+async def keep_summary_job_leased(patent_id: str, section: SummarySection, attempts: int):
+    pool = await DatabaseProvider.get_pool()
+    while True:
+        await asyncio.sleep(giga_chat_api_config.SUMMARY_JOB_LEASE / 3)
+        try:
+            async with pool.acquire() as connection:
+                await renew_summary_job_lease(connection, patent_id, section.value, attempts, giga_chat_api_config.SUMMARY_JOB_LEASE)
+        except Exception as e:
+            print(f"Error while renewing the lease of {section.value} summary of {patent_id}: {e!r}")
+
+
+async def run_leased(patent_id: str, section: SummarySection, attempts: int, awaitable: Awaitable[T]) -> T:
+    # the lease is renewed while the job runs, so only jobs of workers that died are ever reclaimed
+    heartbeat = asyncio.create_task(keep_summary_job_leased(patent_id, section, attempts))
+    try:
+        return await awaitable
+    finally:
+        heartbeat.cancel()
+
+
+async def execute_summary_job(
+    patent_id: str,
+    section: SummarySection,
+    attempts: int,
+    on_progress: Optional[ProgressCallback] = None,
+    on_token: Optional[TokenCallback] = None,
+):
+    pool = await DatabaseProvider.get_pool()
+    try:
+        await run_leased(patent_id, section, attempts, run_summary_job(patent_id, section, on_progress, on_token))
+        status, error = 'done', None
+    except asyncio.CancelledError:
+        # handed back right away instead of waiting for the lease to expire
+        async with pool.acquire() as connection:
+            await asyncio.shield(finish_summary_job(connection, patent_id, section.value, attempts, 'pending'))
+        raise
+    except Exception as e:
+        print(f"Error while generating {section.value} summary of {patent_id}: {e!r}")
+        retry = attempts < giga_chat_api_config.SUMMARY_JOB_MAX_ATTEMPTS and not isinstance(e, (PatentContentNotFoundError, SummaryNotGeneratedError))
+        status, error = ('pending' if retry else 'failed'), repr(e)
+
+    async with pool.acquire() as connection:
+        await finish_summary_job(connection, patent_id, section.value, attempts, status, error)
+
+    finished = _finished.pop((patent_id, section.value), None)
+    if finished is not None:
+        finished.set()
+
+
+async def run_summary_worker():
+    wakeup = get_wakeup_event()
+    while True:
+        try:
+            if await process_next_summary_job():
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error in summary worker: {e!r}")
+
+        try:
+            await asyncio.wait_for(wakeup.wait(), giga_chat_api_config.SUMMARY_JOB_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        wakeup.clear()
+
+
+async def get_summary_job_state(patent_id: str, section: SummarySection) -> SummaryJob:
+    get_patent_content, _ = SECTION_FUNCTIONS[section]
+    pool = await DatabaseProvider.get_pool()
+    async with pool.acquire() as connection:
+        patent_result = await get_patent_content(connection, patent_id)
+        if not patent_result or not patent_result[0]:
+            raise PatentContentNotFoundError("Patent content not found")
+
+        _, summarized_title, summarized_content = patent_result
+        if summarized_title and summarized_content:
+            return SummaryJob(patent_id=patent_id, section=section, status='done', title=summarized_title, summary=summarized_content)
+
+        job = await get_summary_job(connection, patent_id, section.value)
+    status, error = job if job else ('missing', None)
+    return SummaryJob(patent_id=patent_id, section=section, status=status, error=error)
+
+
+async def submit_summary_job(patent_id: str, section: SummarySection) -> SummaryJob:
+    job = await get_summary_job_state(patent_id, section)
+    if job.status == 'done' and job.summary:
+        return job
+
+    pool = await DatabaseProvider.get_pool()
+    async with pool.acquire() as connection:
+        status = await enqueue_summary_job(connection, patent_id, section.value)
+    get_wakeup_event().set()
+    return SummaryJob(patent_id=patent_id, section=section, status=status)
+
+
+async def wait_for_summary_job(patent_id: str, section: SummarySection, timeout: float) -> SummaryJob:
+    return await await_summary_job(await submit_summary_job(patent_id, section), timeout)
+
+
+async def await_summary_job(job: SummaryJob, timeout: float) -> SummaryJob:
+    # local workers signal completion directly, jobs taken by another gunicorn worker are noticed by polling
+    patent_id, section = job.patent_id, job.section
+    deadline = time.monotonic() + timeout
+    while job.status not in FINISHED_STATUSES:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        finished = _finished.setdefault((patent_id, section.value), asyncio.Event())
+        try:
+            await asyncio.wait_for(finished.wait(), min(remaining, giga_chat_api_config.SUMMARY_JOB_POLL_INTERVAL))
+        except asyncio.TimeoutError:
+            pass
+        job = await get_summary_job_state(patent_id, section)
+
+    # jobs finished by another process never pop their event, so each waiter drops it on the way out;
+    # other local waiters merely wake up early and poll once more
+    finished = _finished.pop((patent_id, section.value), None)
+    if finished is not None:
+        finished.set()
+    return job
+
+
+async def follow_summary_job(job: SummaryJob) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    # the job belongs to another request or worker, its status is reported until it finishes
+    while job.status not in FINISHED_STATUSES:
+        yield 'status', {'status': job.status}
+        job = await await_summary_job(job, giga_chat_api_config.SUMMARY_JOB_POLL_INTERVAL)
+
+
+async def stream_summary_job(job: SummaryJob) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    # the job is enqueued already claimed rather than submitted, waking the worker pool would let it win the claim
+    # and leave the stream without progress and tokens
+    patent_id, section = job.patent_id, job.section
+    if job.status != 'done':
+        pool = await DatabaseProvider.get_pool()
+        async with pool.acquire() as connection:
+            attempts = await enqueue_claimed_summary_job(connection, patent_id, section.value, giga_chat_api_config.SUMMARY_JOB_LEASE)
+
+        if attempts is not None:
+            events: asyncio.Queue = asyncio.Queue()
+
+            async def on_progress(stage: str, done: int, total: int):
+                events.put_nowait(('progress', {'stage': stage, 'done': done, 'total': total}))
+
+            async def on_token(text: str):
+                events.put_nowait(('token', {'text': text}))
+
+            task = asyncio.create_task(execute_summary_job(patent_id, section, attempts, on_progress, on_token))
+            try:
+                while not task.done() or not events.empty():
+                    next_event = asyncio.ensure_future(events.get())
+                    await asyncio.wait({next_event, task}, return_when=asyncio.FIRST_COMPLETED)
+                    if next_event.done():
+                        yield next_event.result()
+                    else:
+                        next_event.cancel()
+            finally:
+                if not task.done():
+                    # the client went away, the generation still finishes and is saved for the next request
+                    _detached_jobs.add(task)
+                    task.add_done_callback(_detached_jobs.discard)
+
+        # also covers a failed attempt handed back for a retry by the worker pool
+        job = await get_summary_job_state(patent_id, section)
+        async for event in follow_summary_job(job):
+            yield event
+        job = await get_summary_job_state(patent_id, section)
+
+    if job.status == 'done':
+        yield 'done', {'title': job.title, 'summary': job.summary}
+    else:
+        yield 'error', {'status': job.status, 'error': job.error}
+
+
+class SummaryWorkerPool:
+    _workers: List[asyncio.Task] = []
+
+    @classmethod
+    async def setup(cls):
+        cls._workers = [asyncio.create_task(run_summary_worker()) for _ in range(giga_chat_api_config.SUMMARY_WORKERS)]
+
+    @classmethod
+    async def teardown(cls):
+        for worker in cls._workers:
+            worker.cancel()
+        await asyncio.gather(*cls._workers, return_exceptions=True)
+        cls._workers = []
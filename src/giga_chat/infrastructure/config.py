@@ -10,5 +10,22 @@ class GigaChatApiConfig(BaseSettings):
     TOKEN: str = Field(...)
     SCOPE: Optional[str] = Field(None)
 
+    TIMEOUT: float = Field(120)
+    CALL_TIMEOUT: float = Field(150)
+    SUMMARY_TIMEOUT: float = Field(900)
+    MAX_CONCURRENCY: int = Field(8, ge=1)
+
+    # token counts are measured with cl100k_base, close enough to the GigaChat tokenizer for budgeting
+    SUMMARY_TOKEN_ENCODING: str = Field('cl100k_base')
+    SUMMARY_CHUNK_TOKENS: int = Field(2500, ge=1)
+    SUMMARY_MAP_CONCURRENCY: int = Field(4, ge=1)
+    SUMMARY_REDUCE_MAX_TOKENS: int = Field(4000, ge=1)
+
+    SUMMARY_WORKERS: int = Field(2, ge=1)
+    SUMMARY_JOB_MAX_ATTEMPTS: int = Field(3, ge=1)
+    SUMMARY_JOB_POLL_INTERVAL: float = Field(1)
+    # renewed every third of its length while a job runs, it only bounds how long a dead worker's job stays stuck
+    SUMMARY_JOB_LEASE: float = Field(120, gt=0)
+
 
 giga_chat_api_config = GigaChatApiConfig()
@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import json
+import time
+import zlib
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Set, Tuple, get_type_hints
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, TypeAdapter
+
+from common.api.dependencies import fresh_dependencies
+from redis.config import redis_config
+from redis.redis import RedisProvider
+
+_refreshing_keys: Set[str] = set()
+_prefetching_keys: Set[str] = set()
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def make_request_key(prefix: str, kwargs: Dict[str, Any]) -> str:
+    # only request data takes part in the key, injected dependencies (db, session, ...) are skipped
+    canonical = {}
+    for name, value in kwargs.items():
+        if isinstance(value, BaseModel):
+            canonical[name] = value.model_dump(mode='json')
+        elif value is None or isinstance(value, (str, int, float, bool)):
+            canonical[name] = value
+    digest = hashlib.sha256(json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+    return f'{prefix}:{digest}'
+
+
+def encode_value(value: Any) -> bytes:
+    return zlib.compress(json.dumps(jsonable_encoder(value), ensure_ascii=False).encode(), redis_config.COMPRESSION_LEVEL)
+
+
+def decode_value(raw: bytes) -> Any:
+    return json.loads(zlib.decompress(raw))
+
+
+def spawn_background_task(coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def get_cached_entry(key: str) -> Optional[Tuple[float, Any]]:
+    try:
+        redis = await RedisProvider.get_redis()
+        raw = await redis.get(key)
+    except Exception as e:
+        print(f"Error while reading cache {key=}: {e!r}")
+        return None
+    if raw is None:
+        return None
+    entry = decode_value(raw)
+    return entry['created_at'], entry['value']
+
+
+async def has_cached_entry(key: str) -> bool:
+    try:
+        redis = await RedisProvider.get_redis()
+        return bool(await redis.exists(key))
+    except Exception as e:
+        print(f"Error while checking cache {key=}: {e!r}")
+        # treated as present so a failing redis does not trigger extra upstream work
+        return True
+
+
+def get_next_page_kwargs(kwargs: Dict[str, Any], result: Any) -> Optional[Dict[str, Any]]:
+    total = getattr(result, 'total', None)
+    for name, value in kwargs.items():
+        if not isinstance(value, BaseModel) or getattr(value, 'limit', None) is None or not hasattr(value, 'offset'):
+            continue
+        next_offset = (value.offset or 0) + value.limit
+        if total is None or next_offset >= total:
+            return None
+        return {**kwargs, name: value.model_copy(update={'offset': next_offset})}
+    return None
+
+
+async def set_cached_entry(key: str, value: Any, expire: int, stale_expire: int):
+    try:
+        redis = await RedisProvider.get_redis()
+        # the entry outlives its freshness by stale_expire so it can still be served while being revalidated
+        await redis.set(key, encode_value({'created_at': time.time(), 'value': value}), expire=expire + stale_expire)
+    except Exception as e:
+        print(f"Error while writing cache {key=}: {e!r}")
+
+
+def cached_route(prefix: str, expire: Optional[int] = None, stale_expire: Optional[int] = None, prefetch: bool = False):
+    def decorator(func: Callable):
+        return_type = get_type_hints(func).get('return')
+        adapter = TypeAdapter(return_type) if return_type is not None else None
+        fresh_for = expire if expire is not None else redis_config.EXPIRE
+        stale_for = stale_expire if stale_expire is not None else redis_config.STALE_EXPIRE
+
+        async def compute_and_store(key: str, kwargs: Dict[str, Any]):
+            result = await func(**kwargs)
+            await set_cached_entry(key, result, fresh_for, stale_for)
+            return result
+
+        async def revalidate(key: str, kwargs: Dict[str, Any]):
+            try:
+                async with fresh_dependencies(func, kwargs) as fresh_kwargs:
+                    await compute_and_store(key, fresh_kwargs)
+            except Exception as e:
+                print(f"Error while revalidating cache {key=}: {e!r}")
+            finally:
+                _refreshing_keys.discard(key)
+
+        async def prefetch_next_page(key: str, kwargs: Dict[str, Any]):
+            try:
+                if await has_cached_entry(key):
+                    return
+                async with fresh_dependencies(func, kwargs) as fresh_kwargs:
+                    await compute_and_store(key, fresh_kwargs)
+            except Exception as e:
+                print(f"Error while prefetching {key=}: {e!r}")
+            finally:
+                _prefetching_keys.discard(key)
+
+        def schedule_prefetch(kwargs: Dict[str, Any], result: Any):
+            if not prefetch or not redis_config.PREFETCH_ENABLED:
+                return
+            # prefetches beyond the cap are dropped rather than queued, the page is then computed on demand
+            if len(_prefetching_keys) >= redis_config.PREFETCH_MAX_CONCURRENCY:
+                return
+            next_kwargs = get_next_page_kwargs(kwargs, result)
+            if next_kwargs is None:
+                return
+            next_key = make_request_key(prefix, next_kwargs)
+            if next_key in _prefetching_keys:
+                return
+            _prefetching_keys.add(next_key)
+            spawn_background_task(prefetch_next_page(next_key, next_kwargs))
+
+        @wraps(func)
+        async def wrapper(**kwargs):
+            if not redis_config.ENABLED:
+                return await func(**kwargs)
+
+            key = make_request_key(prefix, kwargs)
+            entry = await get_cached_entry(key)
+            if entry is None:
+                result = await compute_and_store(key, kwargs)
+                schedule_prefetch(kwargs, result)
+                return result
+
+            created_at, value = entry
+            if time.time() - created_at > fresh_for and key not in _refreshing_keys:
+                _refreshing_keys.add(key)
+                spawn_background_task(revalidate(key, kwargs))
+            result = adapter.validate_python(value) if adapter else value
+            schedule_prefetch(kwargs, result)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -8,7 +8,30 @@ class RedisConfig(BaseSettings):
 
     URL: RedisDsn = Field(...)
     EXPIRE: int = Field(60)
+    STALE_EXPIRE: int = Field(300)
     ENABLED: bool = Field(False)
 
+    MIN_SIZE: int = Field(1)
+    MAX_SIZE: int = Field(10)
+    COMPRESSION_LEVEL: int = Field(6, ge=0, le=9)
+
+    SINGLE_FLIGHT_LOCK_TIMEOUT: float = Field(120)
+    SINGLE_FLIGHT_RESULT_EXPIRE: int = Field(30)
+    SINGLE_FLIGHT_POLL_INTERVAL: float = Field(0.1)
+
+    PREFETCH_ENABLED: bool = Field(True)
+    PREFETCH_MAX_CONCURRENCY: int = Field(4, ge=1)
+
+
+class PatentCacheConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix='PATENT_CACHE_')
+
+    ENABLED: bool = Field(True)
+    LOCAL_MAX_BYTES: int = Field(64 * 1024 * 1024)
+    # kept short since invalidations only reach the local tier of the worker that saved the patent
+    LOCAL_TTL: float = Field(30)
+    SHARED_EXPIRE: int = Field(3600)
+
 
 redis_config = RedisConfig()
+patent_cache_config = PatentCacheConfig()
@@ -0,0 +1,177 @@
+import itertools
+import sys
+import zlib
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from asyncpg import Connection
+
+from common.db.model import load_patents
+from common.domain.schema import Patent
+from common.utils.cache import SizedTTLCache
+from redis.config import patent_cache_config, redis_config
+from redis.redis import RedisProvider
+
+
+def estimate_patent_size(patent: Patent) -> int:
+    size = sys.getsizeof(patent)
+    for value in patent.__dict__.values():
+        size += sys.getsizeof(value)
+        if isinstance(value, list):
+            size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+local_patent_cache: SizedTTLCache[str, Patent] = SizedTTLCache(
+    patent_cache_config.LOCAL_MAX_BYTES,
+    patent_cache_config.LOCAL_TTL,
+    estimate_patent_size,
+)
+
+shared_patent_cache_metrics = {'hits': 0, 'misses': 0, 'errors': 0, 'stale_writes': 0}
+
+# KEYS holds pairs of patent and generation keys, ARGV the expire followed by pairs of generation and value.
+# a patent is only stored if its generation is still the one read before loading it, so a load that raced
+# with invalidate_patents can not put the old row back
+SET_PATENTS_SCRIPT = """
+local stored = 0
+for idx = 1, #KEYS, 2 do
+    local generation = redis.call('get', KEYS[idx + 1]) or ''
+    if generation == ARGV[idx + 1] then
+        redis.call('set', KEYS[idx], ARGV[idx + 2], 'ex', ARGV[1])
+        stored = stored + 1
+    end
+end
+return stored
+"""
+
+# bumps the generation before deleting, so any write checked against the old generation is rejected
+INVALIDATE_PATENTS_SCRIPT = """
+for idx = 1, #KEYS, 2 do
+    redis.call('incr', KEYS[idx + 1])
+    redis.call('expire', KEYS[idx + 1], ARGV[1])
+    redis.call('del', KEYS[idx])
+end
+return 0
+"""
+
+# ids invalidated while a lookup was running, per running lookup, so it does not fill the local tier with old rows
+_running_lookups: Dict[int, Set[str]] = {}
+_lookup_tokens = itertools.count()
+
+
+def make_patent_key(id_: str) -> str:
+    return f'patent:{id_}'
+
+
+def make_generation_key(id_: str) -> str:
+    return f'patent:{id_}:generation'
+
+
+async def get_shared_patents(ids: List[str]) -> Tuple[Dict[str, Patent], Optional[Dict[str, str]]]:
+    # the generations are read along with the patents and have to be passed back to set_shared_patents,
+    # they are None when they could not be read and nothing may be written back
+    if not redis_config.ENABLED or not ids:
+        return {}, None
+    try:
+        redis = await RedisProvider.get_redis()
+        raws = await redis.mget(*[make_patent_key(id_) for id_ in ids], *[make_generation_key(id_) for id_ in ids])
+    except Exception as e:
+        shared_patent_cache_metrics['errors'] += 1
+        print(f"Error while reading shared patent cache: {e!r}")
+        return {}, None
+
+    patents, generations = {}, {}
+    for id_, raw, generation in zip(ids, raws[:len(ids)], raws[len(ids):]):
+        generations[id_] = generation.decode() if generation is not None else ''
+        if raw is None:
+            shared_patent_cache_metrics['misses'] += 1
+            continue
+        shared_patent_cache_metrics['hits'] += 1
+        patents[id_] = Patent.model_validate_json(zlib.decompress(raw))
+    return patents, generations
+
+
+async def set_shared_patents(patents: List[Patent], generations: Optional[Dict[str, str]]):
+    patents = [patent for patent in patents if generations is not None and patent.id in generations]
+    if not redis_config.ENABLED or not patents:
+        return
+    keys, args = [], [patent_cache_config.SHARED_EXPIRE]
+    for patent in patents:
+        keys.extend([make_patent_key(patent.id), make_generation_key(patent.id)])
+        args.extend([
+            generations[patent.id],
+            zlib.compress(patent.model_dump_json(exclude_none=True).encode(), redis_config.COMPRESSION_LEVEL),
+        ])
+    try:
+        redis = await RedisProvider.get_redis()
+        stored = await redis.eval(SET_PATENTS_SCRIPT, keys=keys, args=args)
+        shared_patent_cache_metrics['stale_writes'] += len(patents) - stored
+    except Exception as e:
+        shared_patent_cache_metrics['errors'] += 1
+        print(f"Error while writing shared patent cache: {e!r}")
+
+
+async def get_cached_patents(
+    connection: Connection,
+    ids: List[str],
+    load: Callable[[Connection, List[str]], Awaitable[List[Patent]]] = load_patents,
+    cache_loaded: bool = True,
+) -> List[Patent]:
+    # cache_loaded=False is meant for loaders returning partial patents, which must never reach the cache
+    if not patent_cache_config.ENABLED:
+        return await load(connection, ids)
+
+    patents: Dict[str, Patent] = {}
+    for id_ in dict.fromkeys(ids):
+        patent = local_patent_cache.get(id_)
+        if patent is not None:
+            patents[id_] = patent
+
+    token = next(_lookup_tokens)
+    invalidated_ids = _running_lookups[token] = set()
+    try:
+        shared_patents, generations = await get_shared_patents([id_ for id_ in dict.fromkeys(ids) if id_ not in patents])
+        patents.update(shared_patents)
+
+        missing_ids = [id_ for id_ in dict.fromkeys(ids) if id_ not in patents]
+        loaded_patents = await load(connection, missing_ids) if missing_ids else []
+        patents.update({patent.id: patent for patent in loaded_patents})
+        if cache_loaded:
+            await set_shared_patents(loaded_patents, generations)
+    finally:
+        _running_lookups.pop(token)
+
+    cacheable_patents = list(shared_patents.values()) + (loaded_patents if cache_loaded else [])
+    for patent in cacheable_patents:
+        if patent.id not in invalidated_ids:
+            local_patent_cache.set(patent.id, patent)
+
+    return [patents[id_] for id_ in dict.fromkeys(ids) if id_ in patents]
+
+
+async def get_cached_patent(connection: Connection, id_: str) -> Optional[Patent]:
+    patents = await get_cached_patents(connection, [id_])
+    return patents[0] if patents else None
+
+
+async def invalidate_patents(ids: List[str]):
+    for id_ in ids:
+        local_patent_cache.pop(id_)
+    for invalidated_ids in _running_lookups.values():
+        invalidated_ids.update(ids)
+    if not redis_config.ENABLED or not ids:
+        return
+    keys = [key for id_ in ids for key in (make_patent_key(id_), make_generation_key(id_))]
+    try:
+        redis = await RedisProvider.get_redis()
+        await redis.eval(INVALIDATE_PATENTS_SCRIPT, keys=keys, args=[patent_cache_config.SHARED_EXPIRE])
+    except Exception as e:
+        shared_patent_cache_metrics['errors'] += 1
+        print(f"Error while invalidating shared patent cache: {e!r}")
+
+
+def get_patent_cache_metrics() -> Dict[str, Dict[str, int]]:
+    return {
+        'local': local_patent_cache.metrics(),
+        'shared': dict(shared_patent_cache_metrics),
+    }
@@ -1,14 +1,44 @@
-import os
+from typing import Optional
 
 import aioredis
 
 from redis.config import redis_config
 
 
+class UninitializedRedisPoolError(Exception):
+    def __init__(
+        self,
+        message="The redis connection pool has not been properly initialized. Please ensure setup is called",
+    ):
+        self.message = message
+        super().__init__(self.message)
+
+
+class RedisProvider:
+    _redis: Optional[aioredis.Redis] = None
+
+    @classmethod
+    async def setup(cls):
+        cls._redis = await aioredis.create_redis_pool(
+            str(redis_config.URL),
+            minsize=redis_config.MIN_SIZE,
+            maxsize=redis_config.MAX_SIZE,
+        )
+
+    @classmethod
+    async def get_redis(cls) -> aioredis.Redis:
+        if not cls._redis:
+            raise UninitializedRedisPoolError()
+        return cls._redis
+
+    @classmethod
+    async def teardown(cls):
+        if not cls._redis:
+            raise UninitializedRedisPoolError()
+        cls._redis.close()
+        await cls._redis.wait_closed()
+        cls._redis = None
+
+
 async def get_redis() -> aioredis.Redis:
-    redis = await aioredis.create_redis_pool(str(redis_config.URL))
-    try:
-        yield redis
-    finally:
-        redis.close()
-        await redis.wait_closed()
+    return await RedisProvider.get_redis()
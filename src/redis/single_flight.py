@@ -0,0 +1,127 @@
+import asyncio
+import time
+import uuid
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, get_type_hints
+
+from pydantic import TypeAdapter
+
+from redis.cache import decode_value, encode_value, make_request_key
+from redis.config import redis_config
+from redis.redis import RedisProvider
+
+# deletes the lock only if it is still held by the caller, so an expired lock taken over by another worker survives
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_in_flight: Dict[str, asyncio.Future] = {}
+
+
+async def acquire_lock(key: str, token: str) -> Optional[bool]:
+    try:
+        redis = await RedisProvider.get_redis()
+        return await redis.set(
+            key, token, pexpire=int(redis_config.SINGLE_FLIGHT_LOCK_TIMEOUT * 1000), exist=redis.SET_IF_NOT_EXIST
+        )
+    except Exception as e:
+        print(f"Error while acquiring single flight lock {key=}: {e!r}")
+        return None
+
+
+async def release_lock(key: str, token: str):
+    try:
+        redis = await RedisProvider.get_redis()
+        await redis.eval(RELEASE_LOCK_SCRIPT, keys=[key], args=[token])
+    except Exception as e:
+        print(f"Error while releasing single flight lock {key=}: {e!r}")
+
+
+async def publish_result(key: str, value: Any):
+    try:
+        redis = await RedisProvider.get_redis()
+        await redis.set(key, encode_value(value), expire=redis_config.SINGLE_FLIGHT_RESULT_EXPIRE)
+    except Exception as e:
+        print(f"Error while publishing single flight result {key=}: {e!r}")
+
+
+async def wait_for_result(lock_key: str, result_key: str) -> Optional[Any]:
+    deadline = time.monotonic() + redis_config.SINGLE_FLIGHT_LOCK_TIMEOUT
+    try:
+        redis = await RedisProvider.get_redis()
+        while time.monotonic() < deadline:
+            raw = await redis.get(result_key)
+            if raw is not None:
+                return decode_value(raw)
+            if not await redis.exists(lock_key):
+                # the owner gave up without publishing, re-check once in case it published right before releasing
+                raw = await redis.get(result_key)
+                return decode_value(raw) if raw is not None else None
+            await asyncio.sleep(redis_config.SINGLE_FLIGHT_POLL_INTERVAL)
+    except Exception as e:
+        print(f"Error while waiting for single flight result {result_key=}: {e!r}")
+    return None
+
+
+def single_flight(prefix: str):
+    def decorator(func: Callable):
+        return_type = get_type_hints(func).get('return')
+        adapter = TypeAdapter(return_type) if return_type is not None else None
+
+        async def compute_across_workers(key: str, kwargs: Dict[str, Any]):
+            if not redis_config.ENABLED:
+                return await func(**kwargs)
+
+            lock_key, result_key = f'{key}:lock', f'{key}:result'
+            token = uuid.uuid4().hex
+            acquired = await acquire_lock(lock_key, token)
+            if acquired is False:
+                value = await wait_for_result(lock_key, result_key)
+                if value is not None:
+                    return adapter.validate_python(value) if adapter else value
+                return await func(**kwargs)
+
+            try:
+                result = await func(**kwargs)
+                if acquired:
+                    await publish_result(result_key, result)
+                return result
+            finally:
+                if acquired:
+                    await release_lock(lock_key, token)
+
+        @wraps(func)
+        async def wrapper(**kwargs):
+            key = make_request_key(f'single_flight:{prefix}', kwargs)
+            in_flight = _in_flight.get(key)
+            if in_flight is not None:
+                try:
+                    return await asyncio.shield(in_flight)
+                except asyncio.CancelledError:
+                    # the owner's client went away, only propagate if this request was cancelled too
+                    if not in_flight.cancelled():
+                        raise
+
+            future = asyncio.get_running_loop().create_future()
+            _in_flight[key] = future
+            try:
+                result = await compute_across_workers(key, kwargs)
+                future.set_result(result)
+                return result
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # retrieve the exception so it is not reported as never retrieved when nobody else waits
+                future.exception()
+                raise
+            finally:
+                _in_flight.pop(key, None)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,21 @@
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from common.api.lifespan import lifespan as common_lifespan
+from redis.config import redis_config
+from redis.redis import RedisProvider
+from rospatent_scraper.domain.executor import shutdown_executor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with common_lifespan(app):
+        if redis_config.ENABLED:
+            await RedisProvider.setup()
+
+        yield
+
+        if redis_config.ENABLED:
+            await RedisProvider.teardown()
+        shutdown_executor()
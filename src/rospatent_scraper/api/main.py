@@ -1,8 +1,8 @@
 from fastapi import FastAPI
 from starlette.responses import RedirectResponse
 
-from common.api.lifespan import lifespan
 from common.api.middleware import configure_cors
+from rospatent_scraper.api.lifespan import lifespan
 from rospatent_scraper.api.rospatent_scraper_router import rospatent_scraper_router
 
 app = FastAPI(
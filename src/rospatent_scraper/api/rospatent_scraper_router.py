@@ -1,8 +1,6 @@
-import asyncio
 from datetime import datetime
-from typing import Dict, List
+from typing import Any, Dict, List
 
-import aioredis
 from aiohttp import ClientSession
 from asyncpg import Connection
 from fastapi import APIRouter, Depends
@@ -10,14 +8,17 @@ from fastapi import APIRouter, Depends
 from common.api.dependencies import get_client_session, get_db_connection
 from common.db.model import insert_patent_family_similarity
 from common.domain.schema import Patent, PatentSimilarFamilySimple, SearchPatentResponse
+from common.http.session import ClientSessionProvider
 from common.utils.debug import async_timer
-from redis.config import redis_config
-from redis.redis import get_redis
-from rospatent_scraper.domain.additional_info import parse_additional_info
+from redis.cache import cached_route
+from redis.patent_cache import get_patent_cache_metrics
+from redis.single_flight import single_flight
 from rospatent_scraper.domain.all_possible_info import get_all_possible_info
-from rospatent_scraper.domain.db import get_earliest_publication_date, get_existing_patents, get_title_ru, save_patent_similarity, save_patents
+from rospatent_scraper.domain.db import entity_id_caches, get_earliest_publication_date, get_existing_patents, get_title_ru, save_patent_similarity, save_patents
+from rospatent_scraper.domain.document import fetch_patents, reparse_cached_documents
 from rospatent_scraper.domain.family_similar import patent_similar_family_simply
-from rospatent_scraper.domain.full_info import parse_full_info
+from rospatent_scraper.domain.projection import get_projected_fields, project_response
+from rospatent_scraper.domain.scheduler import rospatent_scheduler
 from rospatent_scraper.domain.schema import ClusterRequest, MapRequest, SearchOneRequest, SearchPatentsRequest, SearchSimilarByIdRequest
 from rospatent_scraper.domain.search import search_patents
 from rospatent_scraper.domain.search_similar import search_similar_patent_by_id
@@ -34,6 +35,7 @@ rospatent_scraper_router = APIRouter(
     response_model_exclude_none=True,
 )
 @async_timer
+@cached_route('search')
 async def search(
     query: SearchPatentsRequest = Depends(),
     session: ClientSession = Depends(get_client_session),
@@ -43,7 +45,7 @@ async def search(
 
     await save_patents(db, search_patents_response.patents)
 
-    return search_patents_response
+    return project_response(search_patents_response, query)
 
 
 @rospatent_scraper_router.get(
@@ -51,6 +53,7 @@ async def search(
     response_model_exclude_none=True,
 )
 @async_timer
+@cached_route('search_xlsx')
 async def search(
     query: SearchPatentsRequest = Depends(),
     session: ClientSession = Depends(get_client_session),
@@ -60,7 +63,7 @@ async def search(
 
     await save_patents(db, search_patents_response.patents)
 
-    return search_patents_response
+    return project_response(search_patents_response, query)
 
 
 @rospatent_scraper_router.get(
@@ -73,7 +76,7 @@ async def get_patent_additional_info(
     session: ClientSession = Depends(get_client_session),
     db: Connection = Depends(get_db_connection),
 ) -> List[Patent]:
-    patents: List[Patent] = await asyncio.gather(*[parse_additional_info(id_, session) for id_ in query.ids])
+    patents: List[Patent] = await fetch_patents(query.ids, session)
     await save_patents(db, patents)
     return patents
 
@@ -88,7 +91,7 @@ async def get_patent_full_info(
     session: ClientSession = Depends(get_client_session),
     db: Connection = Depends(get_db_connection),
 ) -> List[Patent]:
-    patents: List[Patent] = await asyncio.gather(*[parse_full_info(id_, session) for id_ in query.ids])
+    patents: List[Patent] = await fetch_patents(query.ids, session)
     await save_patents(db, patents)
     return patents
 
@@ -98,30 +101,21 @@ async def get_patent_full_info(
     response_model_exclude_none=True,
 )
 @async_timer
+@cached_route('search_full_info', prefetch=True)
+@single_flight('search_full_info')
 async def get_all_possible_patent_info(
     query: SearchPatentsRequest = Depends(),
     session: ClientSession = Depends(get_client_session),
     db: Connection = Depends(get_db_connection),
-    redis: aioredis.Redis = Depends(get_redis)
 ) -> SearchPatentResponse:
-    if redis_config.ENABLED:
-        datasets_key = "".join([dataset.value for dataset in query.datasets if dataset])
-        cached_key = f'search_full_info_{str(query.patent_description)}_{query.author}_{query.sort.value}_{datasets_key}_{query.date_from}_{query.date_to}_{query.limit}_{query.offset}'
-        cached_value = await redis.get(cached_key)
-        if cached_value:
-            return SearchPatentResponse.model_validate_json(cached_value.decode())
-
     search_patents_response = await get_all_possible_info(db, query, session)
     # for patent in search_patents_response.patents:
     #     print(patent.title_ru)
 
-    if redis_config.ENABLED:
-        await redis.set(cached_key, search_patents_response.json(), expire=redis_config.EXPIRE)
-    return search_patents_response
+    return project_response(search_patents_response, query)
 
 
 EMBEDDINGS_API_URL = "http://embeddings:8084"
-GIGA_CHAT_API_URL = "http://giga-chat:8082"
 
 
 @rospatent_scraper_router.get(
@@ -129,51 +123,36 @@ GIGA_CHAT_API_URL = "http://giga-chat:8082"
     response_model_exclude_none=True,
 )
 @async_timer
+@cached_route('search_full_info_extended', prefetch=True)
+@single_flight('search_full_info_extended')
 async def get_all_possible_patent_info_extended(
     query: SearchPatentsRequest = Depends(),
     session: ClientSession = Depends(get_client_session),
     db: Connection = Depends(get_db_connection),
-    # redis: aioredis.Redis = Depends(get_redis)
 ) -> SearchPatentResponse:
-    async with session.get(
-        f"{GIGA_CHAT_API_URL}/giga_chat/extent?text={query.patent_description}",
-    ) as response:
-        response_json = await response.json()
-        print(response_json)
-
-    # query.patent_description = response_json
     search_patents_response = await get_all_possible_info(db, query, session)
-    embeddings_request: List[Dict[str, str]] = [
-        {
-            "id": patent.id,
-            "text": patent.title_ru,
-        }
-        for patent in search_patents_response.patents
-    ]
-    unsorted_patent_ids = [patent.id for patent in search_patents_response.patents]
+    rerank_request: Dict[str, Any] = {
+        "text": query.patent_description,
+        "candidates": [
+            {
+                "id": patent.id,
+                "text": patent.title_ru or '',
+            }
+            for patent in search_patents_response.patents
+        ],
+    }
     id_to_patent = {patent.id: patent for patent in search_patents_response.patents}
     async with session.post(
-        f"{EMBEDDINGS_API_URL}/api/v1/gigachat/embeddings",
-        json=embeddings_request,
+        f"{EMBEDDINGS_API_URL}/api/v1/gigachat/rerank",
+        json=rerank_request,
     ) as response:
-        embeddings_response = await response.json()
-        print(embeddings_response)
-
-    async with session.post(
-        f"{EMBEDDINGS_API_URL}/api/v1/gigachat/search?n_results=10&include_embeddings=false&id={'&id='.join(unsorted_patent_ids)}",
-        json={
-            "text": query.patent_description,
-        },
-    ) as response:
-        search_response = await response.json()
-        # print(search_response)
-        sorted_patent_ids = search_response["ids"][0]
-        # print(sorted_patent_ids)
+        rerank_response = await response.json()
+        sorted_patent_ids = rerank_response["ids"]
     search_patents_response.patents = [id_to_patent[id_] for id_ in sorted_patent_ids]
     # for patent in search_patents_response.patents:
     #     print(patent.title_ru)
 
-    return search_patents_response
+    return project_response(search_patents_response, query)
 
 
 @rospatent_scraper_router.get(
@@ -181,6 +160,7 @@ async def get_all_possible_patent_info_extended(
     response_model_exclude_none=True,
 )
 @async_timer
+@cached_route('clusters')
 async def get_clusters(
     query: ClusterRequest = Depends(),
     session: ClientSession = Depends(get_client_session),
@@ -220,6 +200,7 @@ async def get_clusters(
     response_model_exclude_none=True,
 )
 @async_timer
+@cached_route('maps')
 async def get_clusters(
     query: MapRequest = Depends(),
     session: ClientSession = Depends(get_client_session),
@@ -251,28 +232,22 @@ async def get_clusters(
     response_model_exclude_none=True,
 )
 @async_timer
+@cached_route('search_similar', prefetch=True)
 async def search_similar(
     query: SearchSimilarByIdRequest = Depends(),
     session: ClientSession = Depends(get_client_session),
     db: Connection = Depends(get_db_connection),
-    redis: aioredis.Redis = Depends(get_redis)
 ) -> SearchPatentResponse:
-    if redis_config.ENABLED:
-        cached_key = f'search_similar_{query.id}_{query.count}_{query.limit}_{query.offset}'
-        cached_value = await redis.get(cached_key)
-        if cached_value:
-            return SearchPatentResponse.model_validate_json(cached_value.decode())
-
     search_patent_response: SearchPatentResponse = await search_similar_patent_by_id(query, session, db)
     patent_id_to_similar_patent = {patent.id: patent for patent in search_patent_response.patents}
     similar_patent_ids = [patent.id for patent in search_patent_response.patents]
 
-    existed_patents = await get_existing_patents(db, similar_patent_ids)
+    existed_patents = await get_existing_patents(db, similar_patent_ids, get_projected_fields(query), query.text_max_chars)
     patent_id_to_existed_patent = {patent.id: patent for patent in existed_patents}
     existed_patent_ids = {patent.id for patent in existed_patents}
     not_existed_patent_ids = set(similar_patent_ids) - set(existed_patent_ids)
 
-    parsed_patents: List[Patent] = await asyncio.gather(*[parse_full_info(id_, session) for id_ in not_existed_patent_ids])
+    parsed_patents: List[Patent] = await fetch_patents(not_existed_patent_ids, session)
     await save_patents(db, parsed_patents)
     patent_id_to_parsed_patent = {patent.id: patent for patent in parsed_patents}
 
@@ -290,10 +265,7 @@ async def search_similar(
 
     await save_patent_similarity(db, query.id, search_patent_response.patents)
 
-    if redis_config.ENABLED:
-        await redis.set(cached_key, search_patent_response.json(), expire=redis_config.EXPIRE)
-
-    return search_patent_response
+    return project_response(search_patent_response, query)
 
 
 @rospatent_scraper_router.get(
@@ -312,6 +284,7 @@ async def get_patent_title_ru(
     '/similar_family_simple'
 )
 @async_timer
+@cached_route('similar_family_simple')
 async def get_similar_family_simple(
     id: str,
     session: ClientSession = Depends(get_client_session),
@@ -329,3 +302,27 @@ async def earliest_publication_date(
     db: Connection = Depends(get_db_connection),
 ):
     return await get_earliest_publication_date(db)
+
+
+@rospatent_scraper_router.post(
+    '/reparse_cached_documents'
+)
+@async_timer
+async def reparse_documents(
+    query: SearchOneRequest = Depends(),
+    db: Connection = Depends(get_db_connection),
+):
+    reparsed = await reparse_cached_documents(db, query.ids or None)
+    return {'reparsed': reparsed}
+
+
+@rospatent_scraper_router.get(
+    '/metrics'
+)
+async def metrics():
+    return {
+        'client_session': ClientSessionProvider.get_metrics(),
+        'scheduler': rospatent_scheduler.metrics(),
+        'entity_id_cache': {entity_table: cache.metrics() for entity_table, cache in entity_id_caches.items()},
+        'patent_cache': get_patent_cache_metrics(),
+    }
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from asyncpg import Connection, connect
+
+from common.db.config import db_config
+from common.db.model import get_patents_by_ids, refresh_patent_aggregates
+from common.domain.schema import Patent
+
+# get_existing_patents before the read model columns existed
+LEGACY_QUERY = """
+    SELECT p.id, p.title_ru, p.title_en, p.publication_date, p.application_number,
+           p.application_filing_date, p.snippet_ru, p.snippet_en, p.abstract_ru, p.abstract_en,
+           p.claims_ru, p.claims_en, p.description_ru, p.description_en,
+           COALESCE(array_agg(DISTINCT ipc.id) FILTER (WHERE ipc.id IS NOT NULL), NULL) as ipc,
+           COALESCE(array_agg(DISTINCT cpc.id) FILTER (WHERE cpc.id IS NOT NULL), NULL) as cpc,
+           COALESCE(array_agg(DISTINCT pru.name) FILTER (WHERE pru.name IS NOT NULL), NULL) as patentees_ru,
+           COALESCE(array_agg(DISTINCT pen.name) FILTER (WHERE pen.name IS NOT NULL), NULL) as patentees_en,
+           COALESCE(array_agg(DISTINCT aru.name) FILTER (WHERE aru.name IS NOT NULL), NULL) as applicants_ru,
+           COALESCE(array_agg(DISTINCT aen.name) FILTER (WHERE aen.name IS NOT NULL), NULL) as applicants_en,
+           COALESCE(array_agg(DISTINCT iru.name) FILTER (WHERE iru.name IS NOT NULL), NULL) as inventors_ru,
+           COALESCE(array_agg(DISTINCT ien.name) FILTER (WHERE ien.name IS NOT NULL), NULL) as inventors_en
+    FROM patent p
+    LEFT JOIN patent_ipc pi ON p.id = pi.patent_id
+    LEFT JOIN ipc ON pi.ipc_id = ipc.id
+    LEFT JOIN patent_cpc pc ON p.id = pc.patent_id
+    LEFT JOIN cpc ON pc.cpc_id = cpc.id
+    LEFT JOIN patent_patentee_ru ppru ON p.id = ppru.patent_id
+    LEFT JOIN patentee_ru pru ON ppru.patentee_id = pru.id
+    LEFT JOIN patent_patentee_en ppen ON p.id = ppen.patent_id
+    LEFT JOIN patentee_en pen ON ppen.patentee_id = pen.id
+    LEFT JOIN patent_applicant_ru paru ON p.id = paru.patent_id
+    LEFT JOIN applicant_ru aru ON paru.applicant_id = aru.id
+    LEFT JOIN patent_applicant_en paen ON p.id = paen.patent_id
+    LEFT JOIN applicant_en aen ON paen.applicant_id = aen.id
+    LEFT JOIN patent_inventor_ru piru ON p.id = piru.patent_id
+    LEFT JOIN inventor_ru iru ON piru.inventor_id = iru.id
+    LEFT JOIN patent_inventor_en pien ON p.id = pien.patent_id
+    LEFT JOIN inventor_en ien ON pien.inventor_id = ien.id
+    WHERE p.id = ANY($1)
+    GROUP BY p.id;
+"""
+
+RANDOM_IDS_QUERY = """
+    SELECT id FROM patent
+    ORDER BY random()
+    LIMIT $1;
+"""
+
+# the patents where the join fan-out hurts most: many classes times many names
+MOST_LINKED_IDS_QUERY = """
+    SELECT p.id FROM patent p
+    ORDER BY (SELECT count(*) FROM patent_ipc pi WHERE pi.patent_id = p.id)
+           * (SELECT count(*) FROM patent_inventor_ru l WHERE l.patent_id = p.id)
+           * (SELECT count(*) FROM patent_inventor_en l WHERE l.patent_id = p.id) DESC
+    LIMIT $1;
+"""
+
+
+async def get_legacy_patents(connection: Connection, ids: List[str]) -> List[Patent]:
+    results = await connection.fetch(LEGACY_QUERY, ids)
+    return [Patent.model_validate(dict(result)) for result in results]
+
+
+async def measure(connection: Connection, load: Callable[[Connection, List[str]], Awaitable[List[Patent]]], ids: List[str], repeat: int) -> float:
+    await load(connection, ids)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await load(connection, ids)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Compares the legacy join query of get_existing_patents with the read model')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--most-linked', action='store_true', help='pick the patents with the most class and inventor links instead of random ones')
+    args = parser.parse_args()
+
+    connection = await connect(host=db_config.HOST, port=db_config.PORT, user=db_config.USER, database=db_config.DB, password=db_config.PASSWORD)
+    try:
+        ids_query = MOST_LINKED_IDS_QUERY if args.most_linked else RANDOM_IDS_QUERY
+        print(f"{'ids':>6} {'legacy join, ms':>16} {'read model, ms':>16} {'speedup':>8}")
+        for size in args.sizes:
+            ids = [row['id'] for row in await connection.fetch(ids_query, size)]
+            if len(ids) < size:
+                print(f"only {len(ids)} patents in the database, requested {size}")
+            # both queries are compared on up to date read model rows
+            await refresh_patent_aggregates(connection, ids, only_stale=True)
+
+            legacy = await measure(connection, get_legacy_patents, ids, args.repeat)
+            read_model = await measure(connection, get_patents_by_ids, ids, args.repeat)
+            print(f"{len(ids):>6} {legacy * 1000:>16.2f} {read_model * 1000:>16.2f} {legacy / read_model:>7.1f}x")
+    finally:
+        await connection.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
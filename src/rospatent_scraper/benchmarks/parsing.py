@@ -0,0 +1,126 @@
+import argparse
+import json
+import re
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, List, Tuple
+
+from openpyxl import Workbook
+
+from rospatent_scraper.domain.document import parse_raw_document
+from rospatent_scraper.domain.search_xlsx import parse_report_workbook
+from rospatent_scraper.domain.utils import orjson, remove_xml_tags
+from rospatent_scraper.infrastructure.config import executor_config
+
+# the pattern remove_xml_tags used before it was precompiled without lazy backtracking
+LEGACY_XML_TAG_PATTERN = r'<(.*?)>'
+
+
+def make_text(paragraphs: int) -> str:
+    return ''.join(
+        f'<p num="{idx:04d}">Способ по п. {idx}, отличающийся тем, что раствор <b>H<sub>2</sub>SO<sub>4</sub></b> '
+        f'нагревают до <i>{idx % 300} °C</i> и выдерживают в течение {idx % 60} мин.</p>\n'
+        for idx in range(paragraphs)
+    )
+
+
+def make_document(paragraphs: int) -> bytes:
+    text = make_text(paragraphs)
+    names = [{'name': f'Иванов Иван Иванович {idx}'} for idx in range(10)]
+    return json.dumps({
+        'id': 'RU2700000C1_20190101',
+        'common': {
+            'publication_date': '2019.01.01',
+            'application': {'number': '2018100000', 'filing_date': '2018.01.01'},
+            'classification': {
+                'ipc': [{'fullname': f'C07C {idx}/00'} for idx in range(10)],
+                'cpc': [{'fullname': f'C07C {idx}/00'} for idx in range(10)],
+            },
+        },
+        'biblio': {
+            'ru': {'title': 'Способ получения соединения', 'patentee': names, 'applicant': names, 'inventor': names},
+            'en': {'title': 'Method of obtaining a compound', 'patentee': names, 'applicant': names, 'inventor': names},
+        },
+        'abstract': {'ru': text[:4000], 'en': text[:4000]},
+        'claims': {'ru': text[:len(text) // 4], 'en': text[:len(text) // 4]},
+        'description': {'ru': text, 'en': text},
+        'referred_from': [{'id': f'RU{2600000 + idx}C1_20170101'} for idx in range(20)],
+        'prototype_docs': [{'id': f'RU{2500000 + idx}C1_20160101'} for idx in range(20)],
+    }, ensure_ascii=False).encode()
+
+
+def make_workbook(rows: int) -> bytes:
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.cell(row=3, column=2, value=rows)
+    for idx in range(rows):
+        values = [f'RU {2700000 + idx} C1', '2019.01.01', f'Способ получения соединения {idx}', f'{2018100000 + idx}', '2018.01.01', make_text(20)]
+        for column, value in enumerate(values, start=1):
+            sheet.cell(row=9 + idx, column=column, value=value)
+    content = BytesIO()
+    workbook.save(content)
+    return content.getvalue()
+
+
+def measure(name: str, func: Callable[[], Any], repeat: int):
+    func()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"{name:<56} {elapsed * 1000:10.2f} ms")
+
+
+def run_in(executor: Executor, func: Callable[..., Any], calls: List[Tuple[Any, ...]]) -> List[Any]:
+    return [future.result() for future in [executor.submit(func, *args) for args in calls]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks for the CPU-bound scraper transforms')
+    parser.add_argument('--paragraphs', type=int, default=2000, help='paragraphs in the synthetic description')
+    parser.add_argument('--rows', type=int, default=500, help='rows in the synthetic XLSX report')
+    parser.add_argument('--tasks', type=int, default=32, help='documents parsed per executor round')
+    parser.add_argument('--workers', type=int, default=executor_config.MAX_WORKERS)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    raw = make_document(args.paragraphs)
+    text = make_text(args.paragraphs)
+    workbook = make_workbook(args.rows)
+    print(f"document {len(raw) / 1024:.0f} KiB, description {len(text) / 1024:.0f} KiB, workbook {len(workbook) / 1024:.0f} KiB")
+
+    measure('remove_xml_tags, legacy lazy pattern', lambda: re.sub(LEGACY_XML_TAG_PATTERN, '', text), args.repeat)
+    measure('remove_xml_tags, precompiled pattern', lambda: remove_xml_tags(text), args.repeat)
+
+    measure('decode /docs body, json', lambda: json.loads(raw), args.repeat)
+    if orjson is not None:
+        measure('decode /docs body, orjson', lambda: orjson.loads(raw), args.repeat)
+    else:
+        print('orjson is not installed, skipping')
+
+    json_backend = executor_config.JSON_BACKEND
+    for backend in ('json', 'orjson') if orjson is not None else ('json',):
+        executor_config.JSON_BACKEND = backend
+        measure(f'parse_raw_document, {backend}', lambda: parse_raw_document('RU2700000C1_20190101', raw), args.repeat)
+    executor_config.JSON_BACKEND = json_backend
+
+    measure('parse_report_workbook', lambda: parse_report_workbook(workbook, args.rows), args.repeat)
+
+    # the whole round trip per task, including pickling the document and the Patent across the process boundary
+    calls = [(f'RU{2700000 + idx}C1_20190101', raw) for idx in range(args.tasks)]
+    measure(f'{args.tasks} x parse_raw_document, inline', lambda: [parse_raw_document(*call) for call in calls], args.repeat)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        measure(f'{args.tasks} x parse_raw_document, {args.workers} threads', lambda: run_in(executor, parse_raw_document, calls), args.repeat)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        measure(f'{args.tasks} x parse_raw_document, {args.workers} processes', lambda: run_in(executor, parse_raw_document, calls), args.repeat)
+
+    workbook_calls = [(workbook, args.rows)] * max(1, args.workers)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        measure(f'{len(workbook_calls)} x parse_report_workbook, {args.workers} threads', lambda: run_in(executor, parse_report_workbook, workbook_calls), args.repeat)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        measure(f'{len(workbook_calls)} x parse_report_workbook, {args.workers} processes', lambda: run_in(executor, parse_report_workbook, workbook_calls), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,31 +3,27 @@ from typing import List
 
 from common.db.model import insert_patent_family_similarity, insert_patent_prototype_docs, insert_patent_referred_from
 from common.domain.schema import AdditionalPatentIds, Patent
-from rospatent_scraper.domain.additional_info import parse_additional_info
-from rospatent_scraper.domain.db import get_patents_additional_info, insert_many_patents, insert_many_patents_with_id_only, save_patents
+from rospatent_scraper.domain.db import get_patents_additional_info, insert_many_patents_with_id_only, save_patents
+from rospatent_scraper.domain.document import fetch_patents
 from rospatent_scraper.domain.family_similar import patent_similar_family_simply
+from rospatent_scraper.domain.projection import get_projected_fields
+from rospatent_scraper.domain.scheduler import rospatent_scheduler
 from rospatent_scraper.domain.search import search_patents
-from rospatent_scraper.domain.search_xlsx import search_patents_xlsx
+from rospatent_scraper.domain.search_xlsx import enrich_missing_abstracts
 
 
 async def get_all_possible_info(db, query, session):
-    search_patents_response, search_patents_xlsx_response = await asyncio.gather(
-        search_patents(query, session),
-        search_patents_xlsx(query, session),
-    )
-    # search_patents_response = await search_patents(query, session)
-    for search_patent, search_patent_xlsx in zip(search_patents_response.patents, search_patents_xlsx_response.patents):
-        search_patent.abstract_ru = search_patent_xlsx.abstract_ru or search_patent.abstract_ru
+    search_patents_response = await search_patents(query, session)
     await save_patents(db, search_patents_response.patents)
     all_patent_ids = [patent.id for patent in search_patents_response.patents]
-    patents_db_additional_info = await get_patents_additional_info(db, all_patent_ids)
+    patents_db_additional_info = await get_patents_additional_info(db, all_patent_ids, get_projected_fields(query), query.text_max_chars)
     db_id_to_patent = {patent.id: patent for patent in patents_db_additional_info}
     missing_additional_info_patent_ids = [patent.id for patent in patents_db_additional_info if not any([patent.claims_ru, patent.claims_en, patent.description_ru, patent.description_en])]
     # missing_additional_info_patent_ids = all_patent_ids
     additional_empty_patents: List[Patent] = []
     patent_parsed_additional_info, patents_family_similarity = await asyncio.gather(
-        asyncio.gather(*[parse_additional_info(id_, session) for id_ in missing_additional_info_patent_ids]),
-        asyncio.gather(*[patent_similar_family_simply(id_, session) for id_ in missing_additional_info_patent_ids]),
+        fetch_patents(missing_additional_info_patent_ids, session),
+        rospatent_scheduler.map('similar_family', patent_similar_family_simply, missing_additional_info_patent_ids, session, default=lambda id_: []),
     )
     patents_family_similarity_flattened = [patent for patents in patents_family_similarity for patent in patents]
     additional_empty_patents.extend([Patent(id=patent.referred_id) for patent in patents_family_similarity_flattened])
@@ -55,8 +51,11 @@ async def get_all_possible_info(db, query, session):
         if patent.prototype_docs_ids:
             prototype_docs_items.extend([AdditionalPatentIds(source_id=patent.id, referred_id=proto_id) for proto_id in patent.prototype_docs_ids])
             additional_empty_patents.extend([Patent(id=proto_id) for proto_id in patent.prototype_docs_ids])
+    # the /docs responses above already carry abstracts, so the XLSX report is only needed for what is still missing
+    enriched_abstract_patents = await enrich_missing_abstracts(query, search_patents_response.patents, session)
     await insert_many_patents_with_id_only(db, additional_empty_patents)
-    await insert_many_patents(db, search_patents_response.patents)
+    # only freshly fetched data is written back, the rows read above may be projected or truncated
+    await save_patents(db, patent_parsed_additional_info + enriched_abstract_patents)
     await insert_patent_referred_from(db, referred_from_items)
     await insert_patent_prototype_docs(db, prototype_docs_items)
     await insert_patent_family_similarity(db, patents_family_similarity_flattened)
@@ -1,25 +1,29 @@
 from collections import defaultdict
-from typing import List
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 
 from asyncpg import Connection
 
+from common.db.bulk import BulkMerge, copy_merge
+from common.db.model import PATENT_COLUMNS, READ_MODEL_COLUMNS, load_patents, refresh_patent_aggregates
 from common.domain.schema import Patent
+from common.utils.cache import LRUCache
 from common.utils.debug import async_timer
+from redis.patent_cache import get_cached_patent, get_cached_patents, invalidate_patents
+from rospatent_scraper.domain.projection import project_patent, select_patent_columns
+from rospatent_scraper.infrastructure.config import entity_id_cache_config
 
 
-@async_timer
-async def insert_many_patents(connection: Connection, patents: List[Patent]):
-    patent_values = [(patent.id, patent.title_ru, patent.title_en, patent.publication_date,
-                      patent.application_number, patent.application_filing_date, patent.snippet_ru,
-                      patent.snippet_en, patent.abstract_ru, patent.abstract_en, patent.claims_ru,
-                      patent.claims_en, patent.description_ru, patent.description_en)
-                     for patent in patents]
-    await connection.executemany(
+ADDITIONAL_INFO_COLUMNS = ('id', 'abstract_ru', 'abstract_en', 'claims_ru', 'claims_en', 'description_ru', 'description_en')
+
+
+def stage_patents(bulk: BulkMerge, patents: List[Patent]):
+    patent_values = [tuple(getattr(patent, column) for column in PATENT_COLUMNS) for patent in patents]
+    bulk.add(
+        'patent',
+        PATENT_COLUMNS,
+        patent_values,
         """
-        INSERT INTO patent (id, title_ru, title_en, publication_date, application_number, 
-                            application_filing_date, snippet_ru, snippet_en, abstract_ru, 
-                            abstract_en, claims_ru, claims_en, description_ru, description_en)
-        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14)
         ON CONFLICT (id) 
         DO UPDATE SET 
             title_ru = COALESCE(EXCLUDED.title_ru, patent.title_ru),
@@ -36,84 +40,116 @@ async def insert_many_patents(connection: Connection, patents: List[Patent]):
             description_ru = COALESCE(EXCLUDED.description_ru, patent.description_ru),
             description_en = COALESCE(EXCLUDED.description_en, patent.description_en)
         """,
-        patent_values
+        merge_on=('id',),
     )
 
 
 async def insert_many_patents_with_id_only(connection: Connection, patents: List[Patent]):
     patent_values = [(patent.id,) for patent in patents]
-    await connection.executemany(
-        """
-        INSERT INTO patent (id)
-        VALUES ($1)
-        ON CONFLICT DO NOTHING;
-        """,
-        patent_values
+    await copy_merge(
+        connection,
+        'patent',
+        ('id',),
+        patent_values,
+        "ON CONFLICT DO NOTHING",
     )
 
 
-@async_timer
-async def insert_classifications(connection: Connection, classification_data):
+def stage_classifications(bulk: BulkMerge, classification_data):
     for classification_type, ids in classification_data.items():
         classification_ids = [(id,) for patent_id, ids_set in ids.items() for id in ids_set]
-        if classification_ids:
-            await connection.executemany(
-                f"""
-                    INSERT INTO {classification_type} (id)
-                    VALUES ($1)
-                    ON CONFLICT DO NOTHING;
-                    """,
-                classification_ids
-            )
+        bulk.add(
+            classification_type,
+            ('id',),
+            classification_ids,
+            "ON CONFLICT DO NOTHING",
+        )
 
     for classification_type, ids in classification_data.items():
         classification_values = [(patent_id, id) for patent_id, ids_set in ids.items() for id in ids_set]
-        if classification_values:
-            await connection.executemany(
-                f"""
-                INSERT INTO patent_{classification_type} (patent_id, {classification_type}_id)
-                VALUES ($1, $2)
-                ON CONFLICT DO NOTHING;
-                """,
-                classification_values
-            )
+        bulk.add(
+            f'patent_{classification_type}',
+            ('patent_id', f'{classification_type}_id'),
+            classification_values,
+            "ON CONFLICT DO NOTHING",
+        )
+
+
+ENTITY_TABLES = [f'{entity_type}_{lang}' for entity_type in ['patentee', 'applicant', 'inventor'] for lang in ['ru', 'en']]
+
+entity_id_caches: Dict[str, LRUCache[str, int]] = {entity_table: LRUCache(entity_id_cache_config.MAX_SIZE) for entity_table in ENTITY_TABLES}
+
+
+async def upsert_entity_ids(connection: Connection, entity_table: str, names: List[str]) -> Dict[str, int]:
+    # DO NOTHING leaves existing rows unlocked and untouched, their ids are read separately;
+    # new names are inserted in sorted order so concurrent saves take index locks in the same order
+    names = sorted(names)
+    rows = await connection.fetch(
+        f"""
+        INSERT INTO public.{entity_table} (name)
+        SELECT unnest($1::text[]) AS name
+        ON CONFLICT (name) DO NOTHING
+        RETURNING id, name;
+        """,
+        names
+    )
+    entity_ids = {row['name']: row['id'] for row in rows}
+    existing_names = [name for name in names if name not in entity_ids]
+    if existing_names:
+        rows = await connection.fetch(
+            f"""
+            SELECT id, name FROM public.{entity_table}
+            WHERE name = ANY($1::text[]);
+            """,
+            existing_names
+        )
+        entity_ids.update({row['name']: row['id'] for row in rows})
+    return entity_ids
+
+
+def remember_entity_ids(resolved_entity_ids: Dict[str, Dict[str, int]]):
+    for entity_table, entity_id_map in resolved_entity_ids.items():
+        cache = entity_id_caches[entity_table]
+        for name, entity_id in entity_id_map.items():
+            cache.set(name, entity_id)
 
 
 @async_timer
-async def insert_relationships(connection: Connection, relationship_data):
+async def stage_relationships(connection: Connection, bulk: BulkMerge, relationship_data) -> Dict[str, Dict[str, int]]:
+    resolved_entity_ids: Dict[str, Dict[str, int]] = {}
     for entity_type, entity_data in relationship_data.items():
         for lang, data in entity_data.items():
             entity_table = f'{entity_type}_{lang}'
             patent_entity_table = f'patent_{entity_type}_{lang}'
             entities = set()
-            patent_entity_values = []
 
             for patent_id, names in data.items():
                 entities.update(names)
-                patent_entity_values.extend([(patent_id, name) for name in names])
 
             if entities:
-                rows = await connection.fetch(
-                    f"""
-                    INSERT INTO public.{entity_table} (name)
-                    SELECT unnest($1::text[]) AS name
-                    ON CONFLICT (name) DO NOTHING
-                    RETURNING id, name;
-                    """,
-                    list(entities)
-                )
-                entity_id_map = {row['name']: row['id'] for row in rows}
-
-                mapped_values = [(patent_id, entity_id_map[name]) for patent_id, names in data.items() for name in names if name in entity_id_map]
-
-                await connection.executemany(
-                    f"""
-                    INSERT INTO public.{patent_entity_table} (patent_id, {entity_type}_id)
-                    VALUES ($1, $2)
-                    ON CONFLICT DO NOTHING;
-                    """,
-                    mapped_values
+                cache = entity_id_caches[entity_table]
+                entity_id_map: Dict[str, int] = {}
+                unresolved_names: List[str] = []
+                for name in entities:
+                    entity_id = cache.get(name)
+                    if entity_id is None:
+                        unresolved_names.append(name)
+                    else:
+                        entity_id_map[name] = entity_id
+
+                if unresolved_names:
+                    resolved_entity_ids[entity_table] = await upsert_entity_ids(connection, entity_table, unresolved_names)
+                    entity_id_map.update(resolved_entity_ids[entity_table])
+
+                mapped_values = [(patent_id, entity_id_map[name]) for patent_id, names in data.items() for name in names]
+
+                bulk.add(
+                    patent_entity_table,
+                    ('patent_id', f'{entity_type}_id'),
+                    mapped_values,
+                    "ON CONFLICT DO NOTHING",
                 )
+    return resolved_entity_ids
 
 
 @async_timer
@@ -123,8 +159,9 @@ async def save_patents(connection: Connection, patents: List[Patent]):
                          'applicant': {'ru': defaultdict(set), 'en': defaultdict(set)},
                          'inventor': {'ru': defaultdict(set), 'en': defaultdict(set)}}
 
+    bulk = BulkMerge(connection)
     async with connection.transaction():
-        await insert_many_patents(connection, patents)
+        stage_patents(bulk, patents)
 
         for patent in patents:
             if patent.ipc:
@@ -141,8 +178,14 @@ async def save_patents(connection: Connection, patents: List[Patent]):
                     if entities:
                         relationship_data[entity_type][lang][patent.id].update(entities)
 
-        await insert_classifications(connection, classification_data)
-        await insert_relationships(connection, relationship_data)
+        stage_classifications(bulk, classification_data)
+        resolved_entity_ids = await stage_relationships(connection, bulk, relationship_data)
+        await bulk.execute()
+        await refresh_patent_aggregates(connection, [patent.id for patent in patents])
+
+    # ids are cached only once committed, a rolled back insert must not leave dangling ids behind
+    remember_entity_ids(resolved_entity_ids)
+    await invalidate_patents([patent.id for patent in patents])
 
 
 async def get_existed_patent_ids(connection: Connection, ids: List[str]) -> List[str]:
@@ -157,39 +200,13 @@ async def get_existed_patent_ids(connection: Connection, ids: List[str]) -> List
     return [result['id'] for result in results]
 
 
-@async_timer
-async def get_existing_patents(connection: Connection, ids: List[str]) -> List[Patent]:
-    query = """
-        SELECT p.id, p.title_ru, p.title_en, p.publication_date, p.application_number,
-               p.application_filing_date, p.snippet_ru, p.snippet_en, p.abstract_ru, p.abstract_en,
-               p.claims_ru, p.claims_en, p.description_ru, p.description_en,
-               COALESCE(array_agg(DISTINCT ipc.id) FILTER (WHERE ipc.id IS NOT NULL), NULL) as ipc,
-               COALESCE(array_agg(DISTINCT cpc.id) FILTER (WHERE cpc.id IS NOT NULL), NULL) as cpc,
-               COALESCE(array_agg(DISTINCT pru.name) FILTER (WHERE pru.name IS NOT NULL), NULL) as patentees_ru,
-               COALESCE(array_agg(DISTINCT pen.name) FILTER (WHERE pen.name IS NOT NULL), NULL) as patentees_en,
-               COALESCE(array_agg(DISTINCT aru.name) FILTER (WHERE aru.name IS NOT NULL), NULL) as applicants_ru,
-               COALESCE(array_agg(DISTINCT aen.name) FILTER (WHERE aen.name IS NOT NULL), NULL) as applicants_en,
-               COALESCE(array_agg(DISTINCT iru.name) FILTER (WHERE iru.name IS NOT NULL), NULL) as inventors_ru,
-               COALESCE(array_agg(DISTINCT ien.name) FILTER (WHERE ien.name IS NOT NULL), NULL) as inventors_en
-        FROM patent p
-        LEFT JOIN patent_ipc pi ON p.id = pi.patent_id
-        LEFT JOIN ipc ON pi.ipc_id = ipc.id
-        LEFT JOIN patent_cpc pc ON p.id = pc.patent_id
-        LEFT JOIN cpc ON pc.cpc_id = cpc.id
-        LEFT JOIN patent_patentee_ru ppru ON p.id = ppru.patent_id
-        LEFT JOIN patentee_ru pru ON ppru.patentee_id = pru.id
-        LEFT JOIN patent_patentee_en ppen ON p.id = ppen.patent_id
-        LEFT JOIN patentee_en pen ON ppen.patentee_id = pen.id
-        LEFT JOIN patent_applicant_ru paru ON p.id = paru.patent_id
-        LEFT JOIN applicant_ru aru ON paru.applicant_id = aru.id
-        LEFT JOIN patent_applicant_en paen ON p.id = paen.patent_id
-        LEFT JOIN applicant_en aen ON paen.applicant_id = aen.id
-        LEFT JOIN patent_inventor_ru piru ON p.id = piru.patent_id
-        LEFT JOIN inventor_ru iru ON piru.inventor_id = iru.id
-        LEFT JOIN patent_inventor_en pien ON p.id = pien.patent_id
-        LEFT JOIN inventor_en ien ON pien.inventor_id = ien.id
-        WHERE p.id = ANY($1)
-        GROUP BY p.id;
+async def load_projected_patents(connection: Connection, ids: List[str], fields: Optional[List[str]], text_max_chars: Optional[int]) -> List[Patent]:
+    await refresh_patent_aggregates(connection, ids, only_stale=True)
+
+    query = f"""
+        SELECT {select_patent_columns(READ_MODEL_COLUMNS, fields, text_max_chars)}
+        FROM patent
+        WHERE id = ANY($1);
     """
     results = await connection.fetch(query, ids)
     patents = [Patent.model_validate(dict(result)) for result in results]
@@ -197,9 +214,21 @@ async def get_existing_patents(connection: Connection, ids: List[str]) -> List[P
 
 
 @async_timer
-async def get_patents_additional_info(connection: Connection, ids: List[str]) -> List[Patent]:
-    query = """
-            SELECT p.id, p.claims_ru, p.claims_en, p.description_ru, p.description_en
+async def get_existing_patents(connection: Connection, ids: List[str], fields: Optional[List[str]] = None, text_max_chars: Optional[int] = None) -> List[Patent]:
+    if not fields and not text_max_chars:
+        return await get_cached_patents(connection, ids, load_patents)
+
+    # cached patents are projected in place, only the misses are read from the database already projected
+    patents = await get_cached_patents(
+        connection, ids, partial(load_projected_patents, fields=fields, text_max_chars=text_max_chars), cache_loaded=False
+    )
+    return [project_patent(patent, fields, text_max_chars) for patent in patents]
+
+
+@async_timer
+async def get_patents_additional_info(connection: Connection, ids: List[str], fields: Optional[List[str]] = None, text_max_chars: Optional[int] = None) -> List[Patent]:
+    query = f"""
+            SELECT {select_patent_columns(ADDITIONAL_INFO_COLUMNS, fields, text_max_chars, presence_columns=ADDITIONAL_INFO_COLUMNS)}
             FROM patent p
             WHERE p.id = ANY($1);
         """
@@ -215,26 +244,24 @@ async def save_patent_similarity(connection: Connection, search_patent_id: str,
         for similar_patent in similar_patents
     ]
 
-    query = """
-        INSERT INTO patent_similarity (search_patent_id, found_patent_id, similarity, similarity_norm)
-        VALUES ($1, $2, $3, $4)
+    await copy_merge(
+        connection,
+        'patent_similarity',
+        ('search_patent_id', 'found_patent_id', 'similarity', 'similarity_norm'),
+        similarity_data,
+        """
         ON CONFLICT (search_patent_id, found_patent_id) 
         DO UPDATE SET 
             similarity = EXCLUDED.similarity,
-            similarity_norm = EXCLUDED.similarity_norm;
-    """
-
-    await connection.executemany(query, similarity_data)
+            similarity_norm = EXCLUDED.similarity_norm
+        """,
+        merge_on=('search_patent_id', 'found_patent_id'),
+    )
 
 
 async def get_title_ru(connection: Connection, id: str):
-    query = """
-        SELECT title_ru
-        FROM patent
-        WHERE id = $1;
-    """
-    result = await connection.fetchval(query, id)
-    return result
+    patent = await get_cached_patent(connection, id)
+    return patent.title_ru if patent else None
 
 
 async def get_earliest_publication_date(connection: Connection):
@@ -245,3 +272,55 @@ async def get_earliest_publication_date(connection: Connection):
     """
     result = await connection.fetchval(query)
     return result
+
+
+async def get_raw_document(connection: Connection, id: str) -> Optional[bytes]:
+    query = """
+        UPDATE patent_document_raw
+        SET accessed_at = CURRENT_TIMESTAMP
+        WHERE id = $1
+        RETURNING content;
+    """
+    return await connection.fetchval(query, id)
+
+
+async def save_raw_document(connection: Connection, id: str, content: bytes):
+    query = """
+        INSERT INTO patent_document_raw (id, content, size)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (id)
+        DO UPDATE SET
+            content = EXCLUDED.content,
+            size = EXCLUDED.size,
+            fetched_at = CURRENT_TIMESTAMP,
+            accessed_at = CURRENT_TIMESTAMP;
+    """
+    await connection.execute(query, id, content, len(content))
+
+
+@async_timer
+async def evict_raw_documents(connection: Connection, max_bytes: int):
+    query = """
+        DELETE FROM patent_document_raw
+        WHERE id IN (
+            SELECT id
+            FROM (
+                SELECT id, SUM(size) OVER (ORDER BY accessed_at DESC, id) AS retained_size
+                FROM patent_document_raw
+            ) ranked
+            WHERE retained_size > $1
+        );
+    """
+    await connection.execute(query, max_bytes)
+
+
+async def get_raw_documents_batch(connection: Connection, after_id: str, limit: int, ids: Optional[List[str]] = None) -> List[Tuple[str, bytes]]:
+    query = """
+        SELECT id, content
+        FROM patent_document_raw
+        WHERE id > $1 AND ($3::varchar[] IS NULL OR id = ANY($3))
+        ORDER BY id
+        LIMIT $2;
+    """
+    results = await connection.fetch(query, after_id, limit, ids)
+    return [(result['id'], result['content']) for result in results]
@@ -0,0 +1,175 @@
+import asyncio
+import json
+from datetime import datetime
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import ClientSession
+from asyncpg import Connection
+
+from common.domain.schema import Patent
+from common.utils.debug import async_timer
+from rospatent_scraper.domain.db import save_patents
+from rospatent_scraper.domain.document_cache import compress_document, decompress_document, get_cached_document, iter_cached_documents, save_cached_document
+from rospatent_scraper.domain.executor import run_cpu_bound
+from rospatent_scraper.domain.scheduler import gather_with_default, rospatent_scheduler
+from rospatent_scraper.domain.utils import clean_id, loads_json, raise_for_retryable_status, remove_xml_tags
+from rospatent_scraper.infrastructure.config import document_cache_config
+
+_in_flight_patents: Dict[str, asyncio.Future] = {}
+
+
+async def _request_document(id_: str, session: ClientSession) -> bytes:
+    headers = {'Content-Type': 'application/json'}
+    params = {'t': int(datetime.now().timestamp() * 1000)}
+
+    data_row = {
+        'pre_tag': '',
+        'post_tag': '',
+    }
+
+    async with session.post(
+        f"https://searchplatform.rospatent.gov.ru/docs/{id_}",
+        headers=headers,
+        params=params,
+        json=data_row,
+        verify_ssl=False,
+    ) as response:
+        raise_for_retryable_status(response)
+        return await response.read()
+
+
+async def _load_patent(id_: str, session: ClientSession) -> Patent:
+    content = await get_cached_document(id_)
+    if content is not None:
+        patent = await run_cpu_bound(parse_cached_document, id_, content)
+    else:
+        # only the network fetch is scheduled, cache hits spend no upstream tokens or slots
+        raw = await rospatent_scheduler.run('docs', partial(_request_document, id_, session))
+        patent, content = await run_cpu_bound(parse_fetched_document, id_, raw)
+        if content is not None:
+            await save_cached_document(id_, content)
+    return patent or Patent(id=id_)
+
+
+async def _coalesced_load_patent(id_: str, session: ClientSession) -> Patent:
+    future = _in_flight_patents.get(id_)
+    if future is None:
+        # coalesced outside the scheduler, so its timeout and retries act on the one real request
+        future = asyncio.ensure_future(_load_patent(id_, session))
+        _in_flight_patents[id_] = future
+
+        def forget(done: asyncio.Future):
+            if _in_flight_patents.get(id_) is done:
+                del _in_flight_patents[id_]
+
+        future.add_done_callback(forget)
+    # shielded so that one cancelled caller doesn't cancel the request for everyone sharing it
+    return await asyncio.shield(future)
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    return datetime.strptime(value, "%Y.%m.%d") if value else None
+
+
+def _parse_names(biblio_lang: Dict[str, Any], key: str) -> Optional[List[str]]:
+    items = biblio_lang.get(key, None)
+    return [current['name'] for current in items] if items else None
+
+
+def _parse_lang_text(full_patent: Dict[str, Any], key: str, lang: str) -> Optional[str]:
+    section = full_patent.get(key, None)
+    return remove_xml_tags(section.get(lang, None)) if section else None
+
+
+def parse_document(id_: str, full_patent: Dict[str, Any]) -> Patent:
+    common = full_patent.get('common', {})
+    application = common.get('application', {})
+
+    classification = common.get('classification', {})
+    ipc = classification.get('ipc', None)
+    if ipc:
+        ipc = [current['fullname'] for current in ipc]
+
+    cpc = classification.get('cpc', None)
+    if cpc:
+        cpc = [current['fullname'] for current in cpc]
+
+    biblio = full_patent.get('biblio', {})
+    biblio_ru = biblio.get('ru', None) or {}
+    biblio_en = biblio.get('en', None) or {}
+
+    referred_from_ids = [item['id'] for item in full_patent.get('referred_from', [])]
+    prototype_docs_ids = [item['id'] for item in full_patent.get('prototype_docs', [])]
+
+    return Patent(
+        id=full_patent.get('id', id_),
+        title_ru=biblio_ru.get('title', None),
+        title_en=biblio_en.get('title', None),
+        publication_date=_parse_date(common.get('publication_date', None)),
+        application_number=application.get('number', None),
+        application_filing_date=_parse_date(application.get('filing_date', None)),
+        ipc=ipc,
+        cpc=cpc,
+        patentees_ru=_parse_names(biblio_ru, 'patentee'),
+        patentees_en=_parse_names(biblio_en, 'patentee'),
+        applicants_ru=_parse_names(biblio_ru, 'applicant'),
+        applicants_en=_parse_names(biblio_en, 'applicant'),
+        inventors_ru=_parse_names(biblio_ru, 'inventor'),
+        inventors_en=_parse_names(biblio_en, 'inventor'),
+        abstract_ru=_parse_lang_text(full_patent, 'abstract', 'ru'),
+        abstract_en=_parse_lang_text(full_patent, 'abstract', 'en'),
+        claims_ru=_parse_lang_text(full_patent, 'claims', 'ru'),
+        claims_en=_parse_lang_text(full_patent, 'claims', 'en'),
+        description_ru=_parse_lang_text(full_patent, 'description', 'ru'),
+        description_en=_parse_lang_text(full_patent, 'description', 'en'),
+        referred_from_ids=referred_from_ids if referred_from_ids else None,
+        prototype_docs_ids=prototype_docs_ids if prototype_docs_ids else None,
+    )
+
+
+def parse_raw_document(id_: str, raw: bytes) -> Optional[Patent]:
+    try:
+        full_patent = loads_json(raw)
+    except json.decoder.JSONDecodeError:
+        print(f"Error while parsing document for patent {id_=}")
+        return None
+    if not isinstance(full_patent, dict) or not full_patent.get('id'):
+        return None
+    return parse_document(id_, full_patent)
+
+
+def empty_patent(id_: str) -> Patent:
+    return Patent(id=clean_id(id_))
+
+
+def parse_cached_document(id_: str, content: bytes) -> Optional[Patent]:
+    return parse_raw_document(id_, decompress_document(content))
+
+
+def parse_fetched_document(id_: str, raw: bytes) -> Tuple[Optional[Patent], Optional[bytes]]:
+    patent = parse_raw_document(id_, raw)
+    # documents are immutable once published, so only well-formed responses are worth keeping
+    keep = patent is not None and document_cache_config.ENABLED
+    return patent, compress_document(raw) if keep else None
+
+
+@async_timer
+async def fetch_patent(id_: str, session: ClientSession) -> Patent:
+    return await _coalesced_load_patent(clean_id(id_), session)
+
+
+async def fetch_patents(ids: Iterable[str], session: ClientSession) -> List[Patent]:
+    ids = list(ids)
+    return await gather_with_default('docs', ids, [fetch_patent(id_, session) for id_ in ids], empty_patent)
+
+
+@async_timer
+async def reparse_cached_documents(connection: Connection, ids: Optional[List[str]] = None) -> int:
+    reparsed = 0
+    async for batch in iter_cached_documents(ids):
+        parsed = await asyncio.gather(*[run_cpu_bound(parse_cached_document, id_, content) for id_, content in batch])
+        patents = [patent for patent in parsed if patent is not None]
+        await save_patents(connection, patents)
+        reparsed += len(patents)
+    return reparsed
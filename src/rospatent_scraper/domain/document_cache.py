@@ -0,0 +1,52 @@
+from typing import List, Optional, Tuple
+
+import zstandard
+
+from common.db.db import DatabaseProvider
+from rospatent_scraper.domain.db import evict_raw_documents, get_raw_document, get_raw_documents_batch, save_raw_document
+from rospatent_scraper.infrastructure.config import document_cache_config
+
+_saves_since_eviction = 0
+
+
+# (de)compression runs in the cpu executor next to parsing; zstd contexts aren't thread-safe, so each call makes its own
+def compress_document(raw: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=document_cache_config.COMPRESSION_LEVEL).compress(raw)
+
+
+def decompress_document(content: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(content)
+
+
+async def get_cached_document(id_: str) -> Optional[bytes]:
+    if not document_cache_config.ENABLED:
+        return None
+    pool = await DatabaseProvider.get_pool()
+    async with pool.acquire() as connection:
+        return await get_raw_document(connection, id_)
+
+
+async def save_cached_document(id_: str, content: bytes):
+    global _saves_since_eviction
+    if not document_cache_config.ENABLED:
+        return
+    pool = await DatabaseProvider.get_pool()
+    async with pool.acquire() as connection:
+        await save_raw_document(connection, id_, content)
+
+        _saves_since_eviction += 1
+        if _saves_since_eviction >= document_cache_config.EVICTION_INTERVAL:
+            _saves_since_eviction = 0
+            await evict_raw_documents(connection, document_cache_config.MAX_BYTES)
+
+
+async def iter_cached_documents(ids: Optional[List[str]] = None):
+    pool = await DatabaseProvider.get_pool()
+    after_id = ''
+    while True:
+        async with pool.acquire() as connection:
+            batch: List[Tuple[str, bytes]] = await get_raw_documents_batch(connection, after_id, document_cache_config.REPARSE_BATCH_SIZE, ids)
+        if not batch:
+            return
+        yield batch
+        after_id = batch[-1][0]
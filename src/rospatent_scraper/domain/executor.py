@@ -0,0 +1,31 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from rospatent_scraper.infrastructure.config import executor_config
+
+T = TypeVar('T')
+
+_executor: Optional[Executor] = None
+
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if executor_config.KIND == 'process':
+            _executor = ProcessPoolExecutor(max_workers=executor_config.MAX_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=executor_config.MAX_WORKERS, thread_name_prefix='rospatent-cpu')
+    return _executor
+
+
+async def run_cpu_bound(func: Callable[..., T], *args) -> T:
+    # with the process executor func and args must be picklable, i.e. module-level functions and plain data
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
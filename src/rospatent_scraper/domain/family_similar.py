@@ -3,7 +3,7 @@ from typing import List
 
 from common.domain.schema import PatentSimilarFamilySimple
 from common.utils.debug import async_timer
-from rospatent_scraper.domain.utils import clean_id
+from rospatent_scraper.domain.utils import clean_id, raise_for_retryable_status
 
 
 @async_timer
@@ -17,6 +17,7 @@ async def patent_similar_family_simply(id, session):
         params=params,
         headers=headers,
     ) as response:
+        raise_for_retryable_status(response)
         try:
             response_json = await response.json(content_type=None)
         except Exception as e:
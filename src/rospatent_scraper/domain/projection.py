@@ -0,0 +1,53 @@
+from typing import Dict, List, Optional, Sequence
+
+from common.domain.schema import Patent, SearchPatentResponse
+from rospatent_scraper.domain.schema import PatentProjectionRequest
+
+TEXT_FIELDS = ('snippet_ru', 'snippet_en', 'abstract_ru', 'abstract_en', 'claims_ru', 'claims_en', 'description_ru', 'description_en')
+
+
+def get_projected_fields(projection: PatentProjectionRequest) -> Optional[List[str]]:
+    return [field.value for field in projection.fields] or None
+
+
+def select_patent_columns(
+    columns: Sequence[str],
+    fields: Optional[List[str]] = None,
+    text_max_chars: Optional[int] = None,
+    presence_columns: Sequence[str] = (),
+) -> str:
+    # presence_columns are read even when not projected, but only their first character, to tell empty from filled
+    expressions = []
+    for column in columns:
+        projected = column == 'id' or not fields or column in fields
+        if not projected and column in presence_columns:
+            expressions.append(f"left({column}, 1) AS {column}")
+        elif not projected:
+            continue
+        elif text_max_chars and column in TEXT_FIELDS:
+            expressions.append(f"left({column}, {int(text_max_chars)}) AS {column}")
+        else:
+            expressions.append(column)
+    return ', '.join(expressions)
+
+
+def project_patent(patent: Patent, fields: Optional[List[str]] = None, text_max_chars: Optional[int] = None) -> Patent:
+    update: Dict[str, Optional[str]] = {}
+    if fields:
+        update.update({name: None for name in Patent.model_fields if name != 'id' and name not in fields})
+    if text_max_chars:
+        for name in TEXT_FIELDS:
+            value = update.get(name, getattr(patent, name))
+            if value and len(value) > text_max_chars:
+                update[name] = value[:text_max_chars]
+    return patent.model_copy(update=update) if update else patent
+
+
+def project_response(response: SearchPatentResponse, projection: PatentProjectionRequest) -> SearchPatentResponse:
+    fields = get_projected_fields(projection)
+    if not fields and not projection.text_max_chars:
+        return response
+    return SearchPatentResponse(
+        total=response.total,
+        patents=[project_patent(patent, fields, projection.text_max_chars) for patent in response.patents],
+    )
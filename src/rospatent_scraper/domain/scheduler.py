@@ -0,0 +1,180 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from aiohttp import ClientConnectionError, ClientResponseError
+
+from rospatent_scraper.domain.utils import RETRYABLE_STATUSES
+from rospatent_scraper.infrastructure.config import scheduler_config
+
+T = TypeVar('T')
+
+
+def is_retryable(exception: BaseException) -> bool:
+    if isinstance(exception, ClientResponseError):
+        return exception.status in RETRYABLE_STATUSES
+    return isinstance(exception, (asyncio.TimeoutError, ClientConnectionError))
+
+
+async def gather_with_default(
+    endpoint: str,
+    items: List[Any],
+    awaitables: List[Awaitable[T]],
+    default: Optional[Callable[[Any], T]] = None,
+) -> List[T]:
+    # with a default, an item that still fails after its retries degrades on its own instead of failing the batch
+    results = await asyncio.gather(*awaitables, return_exceptions=default is not None)
+    if default is None:
+        return results
+    for idx, (item, result) in enumerate(zip(items, results)):
+        if isinstance(result, Exception):
+            print(f"Giving up on {endpoint} for {item=}: {result!r}")
+            results[idx] = default(item)
+        elif isinstance(result, BaseException):
+            raise result
+    return results
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self):
+        # asyncio primitives are created lazily so that they bind to the worker's running loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class FanOutScheduler:
+    def __init__(
+        self,
+        max_concurrency: int,
+        endpoint_max_concurrency: int,
+        endpoint_max_concurrency_overrides: Dict[str, int],
+        rate_limit_per_second: float,
+        rate_limit_burst: int,
+        retry_attempts: int,
+        retry_backoff_base: float,
+        retry_backoff_max: float,
+        task_timeout: float,
+    ):
+        self.max_concurrency = max_concurrency
+        self.endpoint_max_concurrency = endpoint_max_concurrency
+        self.endpoint_max_concurrency_overrides = endpoint_max_concurrency_overrides
+        self.retry_attempts = retry_attempts
+        self.retry_backoff_base = retry_backoff_base
+        self.retry_backoff_max = retry_backoff_max
+        self.task_timeout = task_timeout
+
+        self._token_bucket = TokenBucket(rate_limit_per_second, rate_limit_burst)
+        self._global_semaphore: Optional[asyncio.Semaphore] = None
+        self._endpoint_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        self._queued: Dict[str, int] = defaultdict(int)
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        self._completed: Dict[str, int] = defaultdict(int)
+        self._retries: Dict[str, int] = defaultdict(int)
+        self._failures: Dict[str, int] = defaultdict(int)
+
+    def _get_semaphores(self, endpoint: str) -> Tuple[asyncio.Semaphore, asyncio.Semaphore]:
+        if self._global_semaphore is None:
+            self._global_semaphore = asyncio.Semaphore(self.max_concurrency)
+        if endpoint not in self._endpoint_semaphores:
+            limit = self.endpoint_max_concurrency_overrides.get(endpoint, self.endpoint_max_concurrency)
+            self._endpoint_semaphores[endpoint] = asyncio.Semaphore(limit)
+        return self._endpoint_semaphores[endpoint], self._global_semaphore
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.retry_backoff_max, self.retry_backoff_base * 2 ** (attempt - 1)))
+
+    async def _run_once(self, endpoint: str, factory: Callable[[], Awaitable[T]]) -> T:
+        endpoint_semaphore, global_semaphore = self._get_semaphores(endpoint)
+
+        self._queued[endpoint] += 1
+        dequeued = False
+        try:
+            # the endpoint slot is taken first so a saturated endpoint doesn't park tasks on global slots
+            async with endpoint_semaphore, global_semaphore:
+                self._queued[endpoint] -= 1
+                dequeued = True
+                self._in_flight[endpoint] += 1
+                try:
+                    await self._token_bucket.acquire()
+                    return await asyncio.wait_for(factory(), timeout=self.task_timeout)
+                finally:
+                    self._in_flight[endpoint] -= 1
+        finally:
+            if not dequeued:
+                self._queued[endpoint] -= 1
+
+    async def run(self, endpoint: str, factory: Callable[[], Awaitable[T]]) -> T:
+        for attempt in range(1, self.retry_attempts + 1):
+            try:
+                result = await self._run_once(endpoint, factory)
+            except Exception as e:
+                if attempt == self.retry_attempts or not is_retryable(e):
+                    self._failures[endpoint] += 1
+                    raise
+                self._retries[endpoint] += 1
+                print(f"Retrying {endpoint} after {e!r} ({attempt=})")
+                await asyncio.sleep(self._backoff(attempt))
+            else:
+                self._completed[endpoint] += 1
+                return result
+
+    async def map(
+        self,
+        endpoint: str,
+        func: Callable[..., Awaitable[T]],
+        items: Iterable[Any],
+        *args: Any,
+        default: Optional[Callable[[Any], T]] = None,
+    ) -> List[T]:
+        items = list(items)
+        return await gather_with_default(endpoint, items, [self.run(endpoint, partial(func, item, *args)) for item in items], default)
+
+    def metrics(self) -> Dict[str, Any]:
+        endpoints = set(self._queued) | set(self._in_flight) | set(self._completed) | set(self._failures)
+        return {
+            'queued': sum(self._queued.values()),
+            'in_flight': sum(self._in_flight.values()),
+            'endpoints': {
+                endpoint: {
+                    'queued': self._queued[endpoint],
+                    'in_flight': self._in_flight[endpoint],
+                    'completed': self._completed[endpoint],
+                    'retries': self._retries[endpoint],
+                    'failures': self._failures[endpoint],
+                }
+                for endpoint in sorted(endpoints)
+            },
+        }
+
+
+rospatent_scheduler = FanOutScheduler(
+    max_concurrency=scheduler_config.MAX_CONCURRENCY,
+    endpoint_max_concurrency=scheduler_config.ENDPOINT_MAX_CONCURRENCY,
+    endpoint_max_concurrency_overrides=scheduler_config.ENDPOINT_MAX_CONCURRENCY_OVERRIDES,
+    rate_limit_per_second=scheduler_config.RATE_LIMIT_PER_SECOND,
+    rate_limit_burst=scheduler_config.RATE_LIMIT_BURST,
+    retry_attempts=scheduler_config.RETRY_ATTEMPTS,
+    retry_backoff_base=scheduler_config.RETRY_BACKOFF_BASE,
+    retry_backoff_max=scheduler_config.RETRY_BACKOFF_MAX,
+    task_timeout=scheduler_config.TASK_TIMEOUT,
+)
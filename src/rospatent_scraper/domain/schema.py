@@ -5,6 +5,8 @@ from typing import List, Optional
 from fastapi import Query
 from pydantic import BaseModel, Field
 
+from common.domain.schema import Patent
+
 
 class SortOrder(str, Enum):
     relevance = "relevance"
@@ -45,7 +47,15 @@ class Dataset(str, Enum):
     # ],
 
 
-class SearchPatentsRequest(BaseModel):
+PatentField = Enum('PatentField', {name: name for name in Patent.model_fields}, type=str)
+
+
+class PatentProjectionRequest(BaseModel):
+    fields: List[PatentField] = Field(Query([]), alias='field')
+    text_max_chars: Optional[int] = Field(None, ge=1)
+
+
+class SearchPatentsRequest(PatentProjectionRequest):
     patent_description: Optional[str] = Field(None)
     author: Optional[str] = Field(None)
     sort: SortOrder = Field(SortOrder.relevance)
@@ -81,7 +91,7 @@ class MapRequest(BaseModel):
     view: str = Field('json')
 
 
-class SearchSimilarByIdRequest(BaseModel):
+class SearchSimilarByIdRequest(PatentProjectionRequest):
     id: str
     count: Optional[int] = 100
     limit: Optional[int] = 10
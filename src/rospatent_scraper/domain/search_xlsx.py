@@ -1,20 +1,18 @@
 from datetime import datetime
 from io import BytesIO
-from typing import List
+from typing import List, Tuple
 
 from aiohttp import ClientSession
 from openpyxl import load_workbook
 
 from common.utils.debug import async_timer
+from rospatent_scraper.domain.executor import run_cpu_bound
 from rospatent_scraper.domain.schema import SearchPatentsRequest
 from common.domain.schema import SearchPatentResponse, Patent
 
 
 @async_timer
 async def search_patents_xlsx(request: SearchPatentsRequest, session: ClientSession) -> SearchPatentResponse:
-    total = 0
-    results: List[Patent] = []
-
     headers = {'Content-Type': 'application/json'}
     params = {'t': int(datetime.now().timestamp() * 1000)}
 
@@ -74,24 +72,28 @@ async def search_patents_xlsx(request: SearchPatentsRequest, session: ClientSess
         json=data_row,
         verify_ssl=False,
     ) as response:
-        pass
-        workbook = load_workbook(BytesIO(await response.read()))
+        content = await response.read()
+
+    total, results = await run_cpu_bound(parse_report_workbook, content, request.limit)
+    return SearchPatentResponse(
+        total=total,
+        patents=results
+    )
+
+
+def parse_report_workbook(content: bytes, limit: int) -> Tuple[int, List[Patent]]:
+    results: List[Patent] = []
+
+    workbook = load_workbook(BytesIO(content), read_only=True)
+    try:
         sheet = workbook.active
 
-        total = sheet['B3'].value
-        # print(f'{total=}')
+        total = next(sheet.iter_rows(min_row=3, max_row=3, min_col=2, max_col=2, values_only=True))[0]
 
-        for row in sheet['A9':f'F{8 + request.limit}']:
-            row_data = [cell.value for cell in row]
+        for row_data in sheet.iter_rows(min_row=9, max_row=8 + limit, max_col=6, values_only=True):
             if all(element is None for element in row_data):
                 break
-            identity = row_data[0]
-            publication_date = row_data[1]
-            title = row_data[2]
-            application_number = row_data[3]
-            application_filing_date = row_data[4]
-            abstract = row_data[5]
-            # print(f'{identity=}, {publication_date=}, {title=}, {application_number=}, {application_filing_date=}, {abstract=}')
+            identity, publication_date, title, application_number, application_filing_date, abstract = row_data
             identity_cleaned = identity.replace(' ', '')
             publication_date_cleaned = publication_date.replace('.', '')
             id_ = f'{identity_cleaned}_{publication_date_cleaned}'
@@ -105,7 +107,30 @@ async def search_patents_xlsx(request: SearchPatentsRequest, session: ClientSess
                     abstract_ru=abstract,
                 )
             )
-    return SearchPatentResponse(
-        total=total,
-        patents=results
-    )
+    finally:
+        workbook.close()
+    return total, results
+
+
+@async_timer
+async def enrich_missing_abstracts(request: SearchPatentsRequest, patents: List[Patent], session: ClientSession) -> List[Patent]:
+    # a hit whose full document is already in hand and still has no abstract has none in the report either
+    missing_positions = [
+        idx for idx, patent in enumerate(patents)
+        if not patent.abstract_ru and not any([patent.claims_ru, patent.claims_en, patent.description_ru, patent.description_en])
+    ]
+    if not missing_positions:
+        return []
+
+    # the hits come from the same query and sort, so only the report rows between the first and last missing one are needed
+    first, last = missing_positions[0], missing_positions[-1]
+    covering_request = request.model_copy(update={'offset': (request.offset or 0) + first, 'limit': last - first + 1})
+    search_patents_xlsx_response = await search_patents_xlsx(covering_request, session)
+    id_to_abstract_ru = {patent.id: patent.abstract_ru for patent in search_patents_xlsx_response.patents if patent.abstract_ru}
+    enriched_patents: List[Patent] = []
+    for idx in missing_positions:
+        patent = patents[idx]
+        if patent.id in id_to_abstract_ru:
+            patent.abstract_ru = id_to_abstract_ru[patent.id]
+            enriched_patents.append(Patent(id=patent.id, abstract_ru=patent.abstract_ru))
+    return enriched_patents
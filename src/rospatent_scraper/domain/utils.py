@@ -1,12 +1,39 @@
+import json
 import re
-from typing import Optional
+from typing import Any, Optional, Union
+
+from aiohttp import ClientResponse
+
+from rospatent_scraper.infrastructure.config import executor_config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# equivalent to the former r'<(.*?)>' (a tag never spans a line break) without the lazy backtracking
+XML_TAG_PATTERN = re.compile(r'<[^>\n]*>')
 
 
 def remove_xml_tags(text: Optional[str]) -> Optional[str]:
     if not text:
         return None
-    return re.sub(r'<(.*?)>', '', text)
+    return XML_TAG_PATTERN.sub('', text)
+
+
+def loads_json(data: Union[bytes, str]) -> Any:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers handle both backends the same way
+    if orjson is not None and executor_config.JSON_BACKEND == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
 
 
 def clean_id(id: str):
     return id.replace('\n', '')
+
+
+def raise_for_retryable_status(response: ClientResponse):
+    if response.status in RETRYABLE_STATUSES:
+        response.raise_for_status()
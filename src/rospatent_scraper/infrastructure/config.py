@@ -0,0 +1,57 @@
+from typing import Dict, Literal
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class SchedulerConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix='ROSPATENT_SCHEDULER_')
+
+    MAX_CONCURRENCY: int = Field(20, ge=1)
+    ENDPOINT_MAX_CONCURRENCY: int = Field(10, ge=1)
+    ENDPOINT_MAX_CONCURRENCY_OVERRIDES: Dict[str, int] = Field({})
+
+    RATE_LIMIT_PER_SECOND: float = Field(20, gt=0)
+    RATE_LIMIT_BURST: int = Field(20, ge=1)
+
+    RETRY_ATTEMPTS: int = Field(3, ge=1)
+    RETRY_BACKOFF_BASE: float = Field(0.5, ge=0)
+    RETRY_BACKOFF_MAX: float = Field(8, ge=0)
+
+    TASK_TIMEOUT: float = Field(60, gt=0)
+
+
+scheduler_config = SchedulerConfig()
+
+
+class DocumentCacheConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix='ROSPATENT_DOCUMENT_CACHE_')
+
+    ENABLED: bool = Field(True)
+    MAX_BYTES: int = Field(2 * 1024 ** 3, ge=0)
+    COMPRESSION_LEVEL: int = Field(10, ge=1, le=22)
+    EVICTION_INTERVAL: int = Field(100, ge=1)
+    REPARSE_BATCH_SIZE: int = Field(100, ge=1)
+
+
+document_cache_config = DocumentCacheConfig()
+
+
+class ExecutorConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix='ROSPATENT_EXECUTOR_')
+
+    KIND: Literal['thread', 'process'] = Field('process')
+    MAX_WORKERS: int = Field(2, ge=1)
+    JSON_BACKEND: Literal['json', 'orjson'] = Field('orjson')
+
+
+executor_config = ExecutorConfig()
+
+
+class EntityIdCacheConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix='ROSPATENT_ENTITY_ID_CACHE_')
+
+    MAX_SIZE: int = Field(50000, ge=0)
+
+
+entity_id_cache_config = EntityIdCacheConfig()